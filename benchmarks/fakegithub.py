@@ -0,0 +1,1055 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""In-process fake of the GitHub REST and GraphQL APIs."""
+
+import base64
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+PERMISSIONS = ("pull", "triage", "push", "maintain", "admin")
+
+GRAPHQL_PERMISSIONS = {
+    "pull": "READ",
+    "triage": "TRIAGE",
+    "push": "WRITE",
+    "maintain": "MAINTAIN",
+    "admin": "ADMIN",
+}
+
+TIMESTAMP = "2023-01-01T00:00:00Z"
+
+
+def _sha(data):
+    """Git blob SHA of some data."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class FakeGitHub(object):
+    """Fake GitHub server holding organisations, repositories and teams.
+
+    :param latency: Seconds to wait before answering each request.
+    :param rate_limit: Number of requests allowed before the server answers
+        with ``403`` rate limit errors.
+    """
+
+    def __init__(self, latency=0.0, rate_limit=1000000):
+        """Initialize server state."""
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.orgs = OrderedDict()
+        self.teams_by_id = {}
+        self.stats = Counter()
+        self.not_modified = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._server = None
+        self._thread = None
+
+    #
+    # State
+    #
+    def add_org(self, name, members=()):
+        """Add an organisation."""
+        org = {
+            "login": name,
+            "id": next(self._ids),
+            "repos": OrderedDict(),
+            "teams": OrderedDict(),
+            "members": set(members),
+            "invitations": OrderedDict(),
+            "failed_invitations": OrderedDict(),
+        }
+        self.orgs[name] = org
+        return org
+
+    def add_repo(self, org, name, files=None, **settings):
+        """Add a repository."""
+        repo = {
+            "name": name,
+            "id": next(self._ids),
+            "org": org,
+            "description": "",
+            "homepage": None,
+            "has_issues": True,
+            "has_wiki": True,
+            "has_downloads": True,
+            "default_branch": "master",
+            "allow_merge_commit": True,
+            "allow_rebase_merge": True,
+            "allow_squash_merge": True,
+            "private": False,
+            "updated_at": TIMESTAMP,
+            "pushed_at": TIMESTAMP,
+            "files": dict(files or {}),
+            "protection": {},
+            "commits": ["0" * 40],
+        }
+        repo.update(settings)
+        self.orgs[org]["repos"][name] = repo
+        return repo
+
+    def add_team(self, org, name, members=(), repositories=None, invitations=()):
+        """Add a team."""
+        team = {
+            "id": next(self._ids),
+            "org": org,
+            "name": name,
+            "slug": re.sub(r"[^a-z0-9]+", "-", name.lower()),
+            "members": set(members),
+            "repos": dict(repositories or {}),
+            "invitations": set(invitations),
+        }
+        self.orgs[org]["teams"][team["slug"]] = team
+        self.teams_by_id[team["id"]] = team
+        return team
+
+    #
+    # Server
+    #
+    @property
+    def url(self):
+        """Base URL of the server."""
+        return "http://127.0.0.1:{}".format(self._server.server_port)
+
+    def start(self):
+        """Start the server in a background thread."""
+        handler = type("Handler", (FakeGitHubHandler,), {"github": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        """Start server."""
+        return self.start()
+
+    def __exit__(self, *args):
+        """Stop server."""
+        self.stop()
+
+    def reset_stats(self):
+        """Reset request statistics and rate limit."""
+        with self._lock:
+            self.stats.clear()
+            self.not_modified = 0
+            self.remaining = self.rate_limit
+
+    #
+    # JSON representations
+    #
+    def _user(self, login):
+        url = "{}/users/{}".format(self.url, login)
+        return {
+            "login": login,
+            "id": abs(hash(login)) % 10000000,
+            "avatar_url": "",
+            "gravatar_id": "",
+            "url": url,
+            "html_url": url,
+            "followers_url": url + "/followers",
+            "following_url": url + "/following{/other_user}",
+            "gists_url": url + "/gists{/gist_id}",
+            "starred_url": url + "/starred{/owner}{/repo}",
+            "subscriptions_url": url + "/subscriptions",
+            "organizations_url": url + "/orgs",
+            "repos_url": url + "/repos",
+            "events_url": url + "/events{/privacy}",
+            "received_events_url": url + "/received_events",
+            "type": "User",
+            "site_admin": False,
+        }
+
+    def _org(self, org):
+        url = "{}/orgs/{}".format(self.url, org["login"])
+        return {
+            "login": org["login"],
+            "id": org["id"],
+            "url": url,
+            "repos_url": url + "/repos",
+            "events_url": url + "/events",
+            "hooks_url": url + "/hooks",
+            "issues_url": url + "/issues",
+            "members_url": url + "/members{/member}",
+            "public_members_url": url + "/public_members{/member}",
+            "avatar_url": "",
+            "description": "",
+            "html_url": url,
+            "created_at": TIMESTAMP,
+            "followers": 0,
+            "following": 0,
+            "public_repos": len(org["repos"]),
+        }
+
+    def _repo(self, repo, permission=None):
+        url = "{}/repos/{}/{}".format(self.url, repo["org"], repo["name"])
+        data = {
+            "id": repo["id"],
+            "name": repo["name"],
+            "full_name": "{}/{}".format(repo["org"], repo["name"]),
+            "owner": self._user(repo["org"]),
+            "private": repo["private"],
+            "fork": False,
+            "url": url,
+            "html_url": url,
+            "description": repo["description"],
+            "homepage": repo["homepage"],
+            "has_issues": repo["has_issues"],
+            "has_wiki": repo["has_wiki"],
+            "has_downloads": repo["has_downloads"],
+            "has_pages": False,
+            "has_projects": False,
+            "archived": False,
+            "default_branch": repo["default_branch"],
+            "allow_merge_commit": repo["allow_merge_commit"],
+            "allow_rebase_merge": repo["allow_rebase_merge"],
+            "allow_squash_merge": repo["allow_squash_merge"],
+            "created_at": TIMESTAMP,
+            "updated_at": repo["updated_at"],
+            "pushed_at": repo["pushed_at"],
+            "clone_url": url + ".git",
+            "git_url": url + ".git",
+            "ssh_url": url + ".git",
+            "svn_url": url,
+            "mirror_url": None,
+            "language": "Python",
+            "size": 1,
+            "forks_count": 0,
+            "network_count": 0,
+            "open_issues_count": 0,
+            "stargazers_count": 0,
+            "subscribers_count": 0,
+            "watchers_count": 0,
+        }
+        for name, template in (
+            ("archive_url", "/{archive_format}{/ref}"),
+            ("assignees_url", "/assignees{/user}"),
+            ("blobs_url", "/git/blobs{/sha}"),
+            ("branches_url", "/branches{/branch}"),
+            ("collaborators_url", "/collaborators{/collaborator}"),
+            ("comments_url", "/comments{/number}"),
+            ("commits_url", "/commits{/sha}"),
+            ("compare_url", "/compare/{base}...{head}"),
+            ("contents_url", "/contents/{+path}"),
+            ("contributors_url", "/contributors"),
+            ("deployments_url", "/deployments"),
+            ("downloads_url", "/downloads"),
+            ("events_url", "/events"),
+            ("forks_url", "/forks"),
+            ("git_commits_url", "/git/commits{/sha}"),
+            ("git_refs_url", "/git/refs{/sha}"),
+            ("git_tags_url", "/git/tags{/sha}"),
+            ("hooks_url", "/hooks"),
+            ("issue_comment_url", "/issues/comments{/number}"),
+            ("issue_events_url", "/issues/events{/number}"),
+            ("issues_url", "/issues{/number}"),
+            ("keys_url", "/keys{/key_id}"),
+            ("labels_url", "/labels{/name}"),
+            ("languages_url", "/languages"),
+            ("merges_url", "/merges"),
+            ("milestones_url", "/milestones{/number}"),
+            ("notifications_url", "/notifications{?since,all,participating}"),
+            ("pulls_url", "/pulls{/number}"),
+            ("releases_url", "/releases{/id}"),
+            ("stargazers_url", "/stargazers"),
+            ("statuses_url", "/statuses/{sha}"),
+            ("subscribers_url", "/subscribers"),
+            ("subscription_url", "/subscription"),
+            ("tags_url", "/tags"),
+            ("teams_url", "/teams"),
+            ("trees_url", "/git/trees{/sha}"),
+        ):
+            data[name] = url + template
+        if permission is not None:
+            level = PERMISSIONS.index(permission)
+            data["permissions"] = {
+                p: PERMISSIONS.index(p) <= level for p in PERMISSIONS
+            }
+        return data
+
+    def _team(self, team):
+        url = "{}/teams/{}".format(self.url, team["id"])
+        return {
+            "id": team["id"],
+            "name": team["name"],
+            "slug": team["slug"],
+            "url": url,
+            "members_url": url + "/members{/member}",
+            "repositories_url": url + "/repos",
+            "permission": "pull",
+            "privacy": "closed",
+            "description": "",
+            "created_at": TIMESTAMP,
+            "updated_at": TIMESTAMP,
+            "members_count": len(team["members"]),
+            "repos_count": len(team["repos"]),
+            "organization": self._org(self.orgs[team["org"]]),
+        }
+
+    def _commit(self, repo, sha):
+        url = "{}/repos/{}/{}/commits/{}".format(
+            self.url, repo["org"], repo["name"], sha
+        )
+        return {
+            "sha": sha,
+            "url": url,
+            "html_url": url,
+            "comments_url": url + "/comments",
+            "author": self._user(repo["org"]),
+            "committer": self._user(repo["org"]),
+            "parents": [],
+            "commit": {
+                "url": url,
+                "sha": sha,
+                "message": "",
+                "author": {"name": "", "email": "", "date": TIMESTAMP},
+                "committer": {"name": "", "email": "", "date": TIMESTAMP},
+                "tree": {"url": url, "sha": sha},
+                "comment_count": 0,
+            },
+        }
+
+    def _git_commit(self, repo, sha):
+        url = "{}/repos/{}/{}/git/commits/{}".format(
+            self.url, repo["org"], repo["name"], sha
+        )
+        return {
+            "sha": sha,
+            "url": url,
+            "html_url": url,
+            "message": "",
+            "author": {"name": "", "email": "", "date": TIMESTAMP},
+            "committer": {"name": "", "email": "", "date": TIMESTAMP},
+            "tree": {"url": url, "sha": sha},
+            "parents": [],
+            "verification": {"verified": False, "reason": "unsigned"},
+        }
+
+    def _branch(self, repo, name):
+        url = "{}/repos/{}/{}/branches/{}".format(
+            self.url, repo["org"], repo["name"], name
+        )
+        return {
+            "name": name,
+            "commit": self._commit(repo, repo["commits"][-1]),
+            "protected": name in repo["protection"],
+            "protection": {
+                "enabled": name in repo["protection"],
+                "required_status_checks": {
+                    "enforcement_level": "off",
+                    "contexts": [],
+                },
+            },
+            "protection_url": url + "/protection",
+            "_links": {"self": url, "html": url},
+        }
+
+    def _contents(self, repo, path, with_content=True):
+        content = repo["files"][path]
+        url = "{}/repos/{}/{}/contents/{}".format(
+            self.url, repo["org"], repo["name"], path
+        )
+        data = {
+            "type": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": _sha(content),
+            "size": len(content),
+            "url": url,
+            "git_url": url,
+            "html_url": url,
+            "download_url": url,
+            "_links": {"self": url, "git": url, "html": url},
+        }
+        if with_content:
+            data["encoding"] = "base64"
+            data["content"] = base64.b64encode(content).decode("ascii")
+        return data
+
+    def _protection(self, repo, branch):
+        p = repo["protection"][branch]
+        url = "{}/repos/{}/{}/branches/{}/protection".format(
+            self.url, repo["org"], repo["name"], branch
+        )
+        data = {
+            "url": url,
+            "required_status_checks": p.get("required_status_checks"),
+            "required_pull_request_reviews": p.get("required_pull_request_reviews"),
+            "enforce_admins": {
+                "url": url + "/enforce_admins",
+                "enabled": bool(p.get("enforce_admins")),
+            },
+            "required_linear_history": {
+                "enabled": bool(p.get("required_linear_history"))
+            },
+            "allow_force_pushes": {"enabled": False},
+            "allow_deletions": {"enabled": False},
+        }
+        restrictions = p.get("restrictions")
+        if restrictions is not None:
+            data["restrictions"] = {
+                "url": url + "/restrictions",
+                "users_url": url + "/restrictions/users",
+                "teams_url": url + "/restrictions/teams",
+                "apps_url": url + "/restrictions/apps",
+                "users": [self._user(u) for u in restrictions.get("users", [])],
+                "teams": [
+                    {"slug": t, "name": t} for t in restrictions.get("teams", [])
+                ],
+                "apps": [],
+            }
+        return data
+
+    def _invitation(self, org, login, team_count=1):
+        invitation = org["invitations"][login]
+        return {
+            "id": invitation["id"],
+            "login": login,
+            "email": None,
+            "role": "direct_member",
+            "created_at": TIMESTAMP,
+            "failed_at": invitation.get("failed_at"),
+            "failed_reason": invitation.get("failed_reason"),
+            "inviter": self._user(org["login"]),
+            "team_count": team_count,
+            "invitation_teams_url": "{}/orgs/{}/invitations/{}/teams".format(
+                self.url, org["login"], invitation["id"]
+            ),
+        }
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """Request handler routing requests to :class:`FakeGitHub`."""
+
+    github = None
+
+    protocol_version = "HTTP/1.1"
+
+    # Avoid delayed ACKs slowing down keep-alive connections.
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("POST", r"/graphql", "graphql"),
+        ("GET", r"/orgs/(?P<org>[^/]+)", "get_org"),
+        ("GET", r"/orgs/(?P<org>[^/]+)/repos", "list_org_repos"),
+        ("GET", r"/orgs/(?P<org>[^/]+)/teams", "list_org_teams"),
+        ("POST", r"/orgs/(?P<org>[^/]+)/teams", "create_team"),
+        ("GET", r"/orgs/(?P<org>[^/]+)/members", "list_org_members"),
+        ("GET", r"/orgs/(?P<org>[^/]+)/invitations", "list_org_invitations"),
+        (
+            "GET",
+            r"/orgs/(?P<org>[^/]+)/failed_invitations",
+            "list_org_failed_invitations",
+        ),
+        ("GET", r"/teams/(?P<team>\d+)", "get_team"),
+        ("DELETE", r"/teams/(?P<team>\d+)", "delete_team"),
+        ("GET", r"/teams/(?P<team>\d+)/members", "list_team_members"),
+        ("GET", r"/teams/(?P<team>\d+)/invitations", "list_team_invitations"),
+        ("PUT", r"/teams/(?P<team>\d+)/memberships/(?P<user>[^/]+)", "invite"),
+        ("DELETE", r"/teams/(?P<team>\d+)/memberships/(?P<user>[^/]+)", "revoke"),
+        ("GET", r"/teams/(?P<team>\d+)/repos", "list_team_repos"),
+        (
+            "PUT",
+            r"/teams/(?P<team>\d+)/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)",
+            "add_team_repo",
+        ),
+        (
+            "DELETE",
+            r"/teams/(?P<team>\d+)/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)",
+            "remove_team_repo",
+        ),
+        ("GET", r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)", "get_repo"),
+        ("PATCH", r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)", "edit_repo"),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/branches/(?P<branch>[^/]+)",
+            "get_branch",
+        ),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/branches/(?P<branch>[^/]+)"
+            r"/protection",
+            "get_protection",
+        ),
+        (
+            "PUT",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/branches/(?P<branch>[^/]+)"
+            r"/protection",
+            "put_protection",
+        ),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/contents/?(?P<path>.*)",
+            "get_contents",
+        ),
+        (
+            "PUT",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/contents/(?P<path>.+)",
+            "put_contents",
+        ),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/ref/(?P<ref>.+)",
+            "get_ref",
+        ),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/refs/(?P<ref>.+)",
+            "get_ref",
+        ),
+        (
+            "PATCH",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/refs/(?P<ref>.+)",
+            "update_ref",
+        ),
+        (
+            "GET",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/trees/(?P<sha>[^/]+)",
+            "get_tree",
+        ),
+        ("POST", r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/trees", "create_tree"),
+        (
+            "POST",
+            r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/commits",
+            "create_commit",
+        ),
+    ]
+
+    _routes = [(m, re.compile(p + "$"), n) for m, p, n in ROUTES]
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+    def do_GET(self):
+        """Handle GET."""
+        self._dispatch("GET")
+
+    def do_POST(self):
+        """Handle POST."""
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        """Handle PUT."""
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        """Handle PATCH."""
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        """Handle DELETE."""
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        gh = self.github
+        url = urlsplit(self.path)
+        path = url.path
+        if path.startswith("/api/v3"):
+            path = path[len("/api/v3") :]
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.body = json.loads(body.decode("utf8")) if body else {}
+
+        if gh.latency:
+            time.sleep(gh.latency)
+
+        for m, regex, name in self._routes:
+            match = regex.match(path)
+            if m == method and match:
+                break
+        else:
+            return self._send(404, {"message": "Not Found"})
+
+        endpoint = "{} {}".format(method, name)
+        with gh._lock:
+            gh.stats[endpoint] += 1
+            if gh.remaining <= 0:
+                return self._send(
+                    403, {"message": "API rate limit exceeded"}, rate_limited=True
+                )
+            kwargs = {k: unquote(v) for k, v in match.groupdict().items()}
+            try:
+                status, data = getattr(self, name)(**kwargs)
+            except KeyError:
+                status, data = 404, {"message": "Not Found"}
+            if isinstance(data, list):
+                return self._send_page(status, data)
+            return self._send(status, data)
+
+    def _send(self, status, data, headers=None, rate_limited=False):
+        gh = self.github
+        body = b"" if data is None else json.dumps(data).encode("utf8")
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if (
+            status == 200
+            and self.command == "GET"
+            and self.headers.get("If-None-Match") == etag
+        ):
+            status, body = 304, b""
+            gh.not_modified += 1
+        elif not rate_limited:
+            gh.remaining -= 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("X-RateLimit-Limit", str(gh.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(max(gh.remaining, 0)))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_page(self, status, items):
+        per_page = min(int(self.query.get("per_page", 30)), 100)
+        page = int(self.query.get("page", 1))
+        last = max(1, (len(items) + per_page - 1) // per_page)
+        data = items[(page - 1) * per_page : page * per_page]
+        base = self.github.url + urlsplit(self.path).path
+        links = []
+        for rel, n in (("next", page + 1), ("last", last)):
+            if n <= last and page < last:
+                query = dict(self.query, page=n, per_page=per_page)
+                links.append('<{}?{}>; rel="{}"'.format(base, urlencode(query), rel))
+        self._send(status, data, {"Link": ", ".join(links)} if links else None)
+
+    #
+    # Organisations
+    #
+    def get_org(self, org):
+        return 200, self.github._org(self.github.orgs[org])
+
+    def list_org_repos(self, org):
+        gh = self.github
+        return 200, [gh._repo(r) for r in gh.orgs[org]["repos"].values()]
+
+    def list_org_teams(self, org):
+        gh = self.github
+        return 200, [gh._team(t) for t in gh.orgs[org]["teams"].values()]
+
+    def list_org_members(self, org):
+        gh = self.github
+        return 200, [gh._user(m) for m in sorted(gh.orgs[org]["members"])]
+
+    def list_org_invitations(self, org):
+        gh = self.github
+        o = gh.orgs[org]
+        return 200, [
+            gh._invitation(o, login)
+            for login, i in o["invitations"].items()
+            if not i.get("failed_at")
+        ]
+
+    def list_org_failed_invitations(self, org):
+        gh = self.github
+        o = gh.orgs[org]
+        return 200, [
+            gh._invitation(o, login)
+            for login, i in o["invitations"].items()
+            if i.get("failed_at")
+        ]
+
+    def create_team(self, org):
+        gh = self.github
+        repositories = {}
+        for full_name in self.body["repo_names"]:
+            # Like GitHub, repositories are given by full name.
+            owner, _, name = full_name.partition("/")
+            if owner != org or name not in gh.orgs[org]["repos"]:
+                return 422, {"message": "Validation Failed"}
+            repositories[name] = "pull"
+        team = gh.add_team(org, self.body["name"], repositories=repositories)
+        return 201, gh._team(team)
+
+    #
+    # Teams
+    #
+    def get_team(self, team):
+        gh = self.github
+        return 200, gh._team(gh.teams_by_id[int(team)])
+
+    def delete_team(self, team):
+        gh = self.github
+        t = gh.teams_by_id.pop(int(team))
+        del gh.orgs[t["org"]]["teams"][t["slug"]]
+        return 204, None
+
+    def list_team_members(self, team):
+        gh = self.github
+        t = gh.teams_by_id[int(team)]
+        return 200, [gh._user(m) for m in sorted(t["members"])]
+
+    def list_team_invitations(self, team):
+        gh = self.github
+        t = gh.teams_by_id[int(team)]
+        o = gh.orgs[t["org"]]
+        return 200, [
+            gh._invitation(o, login)
+            for login in sorted(t["invitations"])
+            if not o["invitations"].get(login, {}).get("failed_at")
+        ]
+
+    def invite(self, team, user):
+        gh = self.github
+        t = gh.teams_by_id[int(team)]
+        org = gh.orgs[t["org"]]
+        if user in org["members"]:
+            t["members"].add(user)
+            state = "active"
+        else:
+            t["invitations"].add(user)
+            if org["invitations"].get(user, {"failed_at": True}).get("failed_at"):
+                org["invitations"][user] = {"id": next(gh._ids)}
+            state = "pending"
+        url = "{}/teams/{}/memberships/{}".format(gh.url, team, user)
+        return 200, {"url": url, "role": "member", "state": state}
+
+    def revoke(self, team, user):
+        t = self.github.teams_by_id[int(team)]
+        t["members"].discard(user)
+        t["invitations"].discard(user)
+        return 204, None
+
+    def list_team_repos(self, team):
+        gh = self.github
+        t = gh.teams_by_id[int(team)]
+        repos = gh.orgs[t["org"]]["repos"]
+        return 200, [
+            gh._repo(repos[name], permission=p)
+            for name, p in sorted(t["repos"].items())
+            if name in repos
+        ]
+
+    def add_team_repo(self, team, org, repo):
+        t = self.github.teams_by_id[int(team)]
+        t["repos"][repo] = self.body.get("permission", "pull")
+        return 204, None
+
+    def remove_team_repo(self, team, org, repo):
+        t = self.github.teams_by_id[int(team)]
+        t["repos"].pop(repo, None)
+        return 204, None
+
+    #
+    # Repositories
+    #
+    def _get_repo(self, org, repo):
+        return self.github.orgs[org]["repos"][repo]
+
+    def get_repo(self, org, repo):
+        return 200, self.github._repo(self._get_repo(org, repo))
+
+    def edit_repo(self, org, repo):
+        r = self._get_repo(org, repo)
+        for k, v in self.body.items():
+            if k != "name":
+                r[k] = v
+        r["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return 200, self.github._repo(r)
+
+    def get_branch(self, org, repo, branch):
+        return 200, self.github._branch(self._get_repo(org, repo), branch)
+
+    def get_protection(self, org, repo, branch):
+        r = self._get_repo(org, repo)
+        if branch not in r["protection"]:
+            return 404, {"message": "Branch not protected"}
+        return 200, self.github._protection(r, branch)
+
+    def put_protection(self, org, repo, branch):
+        r = self._get_repo(org, repo)
+        r["protection"][branch] = self.body
+        return 200, self.github._protection(r, branch)
+
+    def get_contents(self, org, repo, path):
+        gh = self.github
+        r = self._get_repo(org, repo)
+        path = path.strip("/")
+        if path in r["files"]:
+            return 200, gh._contents(r, path)
+        prefix = path + "/" if path else ""
+        entries = OrderedDict()
+        for p in sorted(r["files"]):
+            if not p.startswith(prefix):
+                continue
+            name = p[len(prefix) :].split("/", 1)[0]
+            if "/" in p[len(prefix) :]:
+                entries.setdefault(name, {"type": "dir", "name": name})
+            else:
+                entries[name] = gh._contents(r, p, with_content=False)
+        if not entries:
+            return 404, {"message": "Not Found"}
+        return 200, [
+            dict(
+                {
+                    "path": prefix + name,
+                    "sha": "0" * 40,
+                    "size": 0,
+                    "url": "",
+                    "git_url": "",
+                    "html_url": "",
+                    "download_url": None,
+                    "_links": {},
+                },
+                **e
+            )
+            for name, e in entries.items()
+        ]
+
+    def _commit_files(self, r, files):
+        gh = self.github
+        r["files"].update(files)
+        sha = hashlib.sha1(json.dumps(sorted(r["files"])).encode("utf8"))
+        sha.update(str(len(r["commits"])).encode("utf8"))
+        r["commits"].append(sha.hexdigest())
+        r["pushed_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return r["commits"][-1]
+
+    def put_contents(self, org, repo, path):
+        gh = self.github
+        r = self._get_repo(org, repo)
+        exists = path in r["files"]
+        if exists and self.body.get("sha") != _sha(r["files"][path]):
+            return 409, {"message": "sha does not match"}
+        sha = self._commit_files(r, {path: base64.b64decode(self.body["content"])})
+        return (200 if exists else 201), {
+            "content": gh._contents(r, path),
+            "commit": gh._git_commit(r, sha),
+        }
+
+    def get_ref(self, org, repo, ref):
+        gh = self.github
+        r = self._get_repo(org, repo)
+        url = "{}/repos/{}/{}/git/refs/{}".format(gh.url, org, repo, ref)
+        sha = r["commits"][-1]
+        return 200, {
+            "ref": "refs/" + ref,
+            "url": url,
+            "object": {"type": "commit", "sha": sha, "url": url},
+        }
+
+    def update_ref(self, org, repo, ref):
+        r = self._get_repo(org, repo)
+        pending = r.get("pending", {}).pop(self.body["sha"], None)
+        if pending is None:
+            return 422, {"message": "Object does not exist"}
+        parent, files = pending
+        if parent != r["commits"][-1] and not self.body.get("force"):
+            return 422, {"message": "Update is not a fast forward"}
+        r["files"].update(files)
+        r["commits"].append(self.body["sha"])
+        r["pushed_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return self.get_ref(org, repo, ref)
+
+    def get_tree(self, org, repo, sha):
+        r = self._get_repo(org, repo)
+        return 200, {
+            "sha": sha,
+            "url": "",
+            "truncated": False,
+            "tree": [
+                {"path": p, "mode": "100644", "type": "blob", "sha": _sha(c)}
+                for p, c in sorted(r["files"].items())
+            ],
+        }
+
+    def create_tree(self, org, repo):
+        r = self._get_repo(org, repo)
+        files = {}
+        for entry in self.body["tree"]:
+            files[entry["path"]] = entry["content"].encode("utf8")
+        sha = hashlib.sha1(json.dumps(self.body, sort_keys=True).encode("utf8"))
+        r.setdefault("trees", {})[sha.hexdigest()] = files
+        url = "{}/repos/{}/{}/git/trees/{}".format(
+            self.github.url, org, repo, sha.hexdigest()
+        )
+        return 201, {"sha": sha.hexdigest(), "url": url, "tree": []}
+
+    def create_commit(self, org, repo):
+        r = self._get_repo(org, repo)
+        files = r.get("trees", {})[self.body["tree"]]
+        sha = hashlib.sha1(json.dumps(self.body, sort_keys=True).encode("utf8"))
+        r.setdefault("pending", {})[sha.hexdigest()] = (
+            self.body["parents"][0],
+            files,
+        )
+        return 201, self.github._git_commit(r, sha.hexdigest())
+
+    #
+    # GraphQL
+    #
+    def graphql(self):
+        gh = self.github
+        query = self.body["query"]
+        variables = self.body.get("variables") or {}
+        if "team(slug: $slug)" in query:
+            org = gh.orgs[variables["org"]]
+            team = org["teams"][variables["slug"]]
+            return 200, {
+                "data": {
+                    "organization": {
+                        "team": {
+                            "repositories": self._gql_team_repositories(
+                                team, variables.get("cursor")
+                            )
+                        }
+                    }
+                }
+            }
+        if "teams(first: 100" in query:
+            org = gh.orgs[variables["org"]]
+            teams = list(org["teams"].values())
+            start = int(variables.get("cursor") or 0)
+            page = teams[start : start + 100]
+            return 200, {
+                "data": {
+                    "organization": {
+                        "teams": {
+                            "pageInfo": {
+                                "hasNextPage": start + 100 < len(teams),
+                                "endCursor": str(start + 100),
+                            },
+                            "nodes": [self._gql_team(t, query) for t in page],
+                        }
+                    }
+                }
+            }
+        files = dict(re.findall(r'(f\d+): object\(expression: "HEAD:([^"]+)"\)', query))
+        data, errors = {}, []
+        for key, name in variables.items():
+            if not re.match(r"n\d+$", key):
+                continue
+            alias = "r" + key[1:]
+            owner = variables["o" + key[1:]]
+            try:
+                repo = gh.orgs[owner]["repos"][name]
+            except KeyError:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias]})
+                continue
+            data[alias] = self._gql_repository(repo, files)
+        return 200, {"data": data, "errors": errors} if errors else {"data": data}
+
+    def _gql_team_repositories(self, team, cursor=None):
+        items = sorted(team["repos"].items())
+        start = int(cursor or 0)
+        return {
+            "pageInfo": {
+                "hasNextPage": start + 100 < len(items),
+                "endCursor": str(start + 100),
+            },
+            "edges": [
+                {"permission": GRAPHQL_PERMISSIONS[p], "node": {"name": name}}
+                for name, p in items[start : start + 100]
+            ],
+        }
+
+    def _gql_team(self, team, query):
+        data = {
+            "name": team["name"],
+            "slug": team["slug"],
+            "repositories": self._gql_team_repositories(team),
+        }
+        if "members(" in query:
+            data["members"] = {
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "nodes": [{"login": m} for m in sorted(team["members"])],
+            }
+        if "invitations(" in query:
+            invitations = self.github.orgs[team["org"]]["invitations"]
+            data["invitations"] = {
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "nodes": [
+                    {"invitee": {"login": m}, "email": None}
+                    for m in sorted(team["invitations"])
+                    if not invitations.get(m, {}).get("failed_at")
+                ],
+            }
+        return data
+
+    def _gql_repository(self, repo, files):
+        data = {
+            "name": repo["name"],
+            "description": repo["description"],
+            "homepageUrl": repo["homepage"],
+            "hasIssuesEnabled": repo["has_issues"],
+            "hasWikiEnabled": repo["has_wiki"],
+            "mergeCommitAllowed": repo["allow_merge_commit"],
+            "rebaseMergeAllowed": repo["allow_rebase_merge"],
+            "squashMergeAllowed": repo["allow_squash_merge"],
+            "updatedAt": repo["updated_at"],
+            "pushedAt": repo["pushed_at"],
+            "defaultBranchRef": {"name": repo["default_branch"]},
+            "branchProtectionRules": {
+                "nodes": [
+                    {
+                        "pattern": branch,
+                        "requiresLinearHistory": bool(p.get("required_linear_history")),
+                        "isAdminEnforced": bool(p.get("enforce_admins")),
+                        "requiresApprovingReviews": bool(
+                            p.get("required_pull_request_reviews")
+                        ),
+                        "requiresStatusChecks": bool(p.get("required_status_checks")),
+                        "restrictsPushes": p.get("restrictions") is not None,
+                        "pushAllowances": {
+                            "nodes": [
+                                {"actor": {"slug": t}}
+                                for t in (p.get("restrictions") or {}).get("teams", [])
+                            ]
+                            + [
+                                {"actor": {"login": u}}
+                                for u in (p.get("restrictions") or {}).get("users", [])
+                            ]
+                        },
+                    }
+                    for branch, p in sorted(repo["protection"].items())
+                ]
+            },
+        }
+        for alias, path in files.items():
+            content = repo["files"].get(path)
+            data[alias] = (
+                {"oid": _sha(content), "text": content.decode("utf8")}
+                if content is not None
+                else None
+            )
+        return data
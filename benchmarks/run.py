@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Benchmark metainvenio commands against a local fake GitHub API.
+
+Each command runs in its own interpreter against a freshly populated fake
+server, and the wall time, peak memory and requests per endpoint are
+reported::
+
+    $ python benchmarks/run.py -s 10 -s 100 --latency 0.005
+"""
+
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+import yaml
+from fakegithub import FakeGitHub
+
+COMMANDS = ("repos-configure", "teams-sync", "repos-conf-check", "yaml-template")
+
+ORG = "bench"
+
+CHILD = """
+import json, resource, sys, time
+import github3
+from click.testing import CliRunner
+from metainvenio.cli import cli
+from metainvenio.cli import github as cli_github
+
+def GitHub(token):
+    client = github3.GitHub(token=token)
+    client.session.base_url = sys.argv[1]
+    return client
+
+cli_github.GitHub = GitHub
+start = time.perf_counter()
+result = CliRunner().invoke(cli, sys.argv[2:])
+wall = time.perf_counter() - start
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform != "darwin":
+    maxrss *= 1024
+print(json.dumps({"exit_code": result.exit_code, "wall": wall, "maxrss": maxrss}))
+"""
+
+
+def populate(fake, size):
+    """Populate the fake server and return the matching configuration.
+
+    The remote state deliberately differs from the configuration (settings,
+    missing teams and members) so commands have changes to make.
+    """
+    users = ["user{}".format(i) for i in range(max(10, size // 5))]
+    fake.add_org(ORG, members=users)
+
+    repos = {}
+    for i in range(size):
+        name = "repo{:05d}".format(i)
+        maintainers = [users[i % len(users)], users[(i + 1) % len(users)]]
+        files = {"MAINTAINERS": maintainers[0].encode("utf8")} if i % 2 else {}
+        fake.add_repo(ORG, name, files=files)
+        if i % 2:
+            fake.add_team(
+                ORG,
+                "{}-maintainers".format(name),
+                members=maintainers[:1],
+                repositories={name: "maintain"},
+            )
+        repos[name] = {
+            "description": "Repository {}".format(i),
+            "maintainers": maintainers,
+            "state": "stable",
+            "type": "independent",
+        }
+
+    names = sorted(repos)
+    teams = {"everyone": {"members": users[:3], "repositories": "*"}}
+    for i in range(max(2, size // 10)):
+        name = "team{:04d}".format(i)
+        members = users[i % len(users) : i % len(users) + 3]
+        repositories = names[i * 10 : i * 10 + 10]
+        teams[name] = {
+            "members": members,
+            "repositories": repositories,
+            "permission": "push",
+        }
+        if i % 2:
+            fake.add_team(
+                ORG,
+                name,
+                members=members[:1],
+                repositories={r: "push" for r in repositories},
+            )
+    return {"orgs": {ORG: {"teams": teams, "repositories": repos}}}
+
+
+def run_command(size, command, args, latency, rate_limit, write_interval):
+    """Run a command against a freshly populated fake server."""
+    workdir = tempfile.mkdtemp(prefix="metainvenio-bench-")
+    confpath = os.path.join(workdir, "repositories.yml")
+    try:
+        with FakeGitHub(latency=latency, rate_limit=rate_limit) as fake:
+            with open(confpath, "w") as fp:
+                yaml.safe_dump(populate(fake, size), fp)
+            fake.reset_stats()
+            out = subprocess.check_output(
+                [
+                    sys.executable,
+                    "-c",
+                    CHILD,
+                    fake.url,
+                    "-c",
+                    confpath,
+                    "--cache-dir",
+                    os.path.join(workdir, "cache"),
+                    "github",
+                    "-t",
+                    "token",
+                    "--write-interval",
+                    str(write_interval),
+                    command,
+                ]
+                + list(args),
+                cwd=workdir,
+            )
+            result = json.loads(out.decode("utf8").splitlines()[-1])
+            result.update(
+                size=size,
+                command=" ".join([command] + list(args)),
+                requests=sum(fake.stats.values()),
+                endpoints=dict(sorted(fake.stats.items())),
+                not_modified=fake.not_modified,
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    "-s",
+    help="Number of repositories in the synthetic organisation.",
+    type=int,
+    multiple=True,
+    default=(10, 100, 1000, 5000),
+    show_default=True,
+)
+@click.option(
+    "--command",
+    "-c",
+    "commands",
+    help="Command to run (with arguments).",
+    multiple=True,
+    default=COMMANDS,
+    show_default=True,
+)
+@click.option("--latency", help="Latency per request in seconds.", default=0.0)
+@click.option(
+    "--rate-limit", help="Requests allowed by the fake server.", default=1000000
+)
+@click.option(
+    "--write-interval",
+    help="Minimum seconds between write requests of the client.",
+    default=0.0,
+    show_default=True,
+)
+@click.option("--endpoints", help="Show requests per endpoint.", is_flag=True)
+@click.option("--output", "-o", help="Write results as JSON.", type=click.File("w"))
+def main(sizes, commands, latency, rate_limit, write_interval, endpoints, output):
+    """Benchmark metainvenio commands against a fake GitHub API."""
+    results = []
+    click.echo(
+        "{:>6}  {:<40} {:>9} {:>9} {:>10}".format(
+            "repos", "command", "wall [s]", "requests", "peak [MB]"
+        )
+    )
+    for size in sizes:
+        for command in commands:
+            command, *args = command.split()
+            start = time.perf_counter()
+            res = run_command(size, command, args, latency, rate_limit, write_interval)
+            res["total"] = time.perf_counter() - start
+            results.append(res)
+            click.secho(
+                "{size:>6}  {command:<40} {wall:>9.2f} {requests:>9} {mb:>10.1f}".format(
+                    mb=res["maxrss"] / 1024.0 / 1024.0, **res
+                ),
+                fg="red" if res["exit_code"] else None,
+            )
+            if endpoints:
+                for endpoint, count in res["endpoints"].items():
+                    click.echo("{:>8}{:<40} {:>9}".format("", endpoint, count))
+    if output:
+        json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
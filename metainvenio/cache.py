@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Per-run cache of remote resources."""
+
+import threading
+
+
+class ResourceCache(object):
+    """Thread-safe cache of remote objects fetched during a single run.
+
+    Keys are tuples describing the resource hierarchically, e.g.
+    ``("repo", "myorg", "myrepo")`` and
+    ``("repo", "myorg", "myrepo", "branch", "master")``, so that invalidating
+    a key also invalidates everything below it.
+    """
+
+    def __init__(self):
+        """Initialize the cache."""
+        self._data = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, fetch):
+        """Get a resource, calling ``fetch()`` on first access only."""
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        # Only one thread fetches a given resource, others wait for it.
+        with self._key_lock(key):
+            if key not in self._data:
+                self._data[key] = fetch()
+            return self._data[key]
+
+    def lookup(self, key, default=None):
+        """Get a resource if it is in the cache, without fetching it."""
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        """Store a resource."""
+        self._data[key] = value
+
+    def invalidate(self, *key):
+        """Invalidate a resource and all resources below it."""
+        n = len(key)
+        with self._lock:
+            for k in list(self._data):
+                if k[:n] == key:
+                    self._data.pop(k, None)
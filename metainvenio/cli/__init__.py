@@ -24,11 +24,6 @@
 
 """Command line interface for MetaInvenio."""
 
-import click
-import yaml
-from attrdict import AttrDict
-
-from .conf import conf
-from .github import github
 from .main import cli
-from .pypi import pypi
+
+__all__ = ("cli",)
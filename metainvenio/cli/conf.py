@@ -26,8 +26,6 @@
 
 import click
 
-from .main import cli
-
 
 def _maintainer_row(maintainers, selected):
     row = []
@@ -39,7 +37,7 @@ def _maintainer_row(maintainers, selected):
     return row
 
 
-@cli.group()
+@click.group()
 def conf():
     """Configuration helpers."""
 
@@ -50,11 +48,7 @@ def conf_repo_overview(ctx):
     """Repositories overview as CSV."""
     conf = ctx.obj["config"]
 
-    # Extract list of maintainers.
-    maintainers = set()
-    for repo in conf.repositories:
-        maintainers.update(repo.maintainers)
-    maintainers = list(sorted(maintainers))
+    maintainers = conf.maintainers
 
     # Write header.
     click.echo(
@@ -24,62 +24,464 @@
 
 """Command line interface for MetaInvenio."""
 
+import json
+import os
+
 import click
 import yaml
 from github3 import GitHub
 
-from ..github import OrgAPI, RepositoryAPI
-from .main import cli
+from ..cache import ResourceCache
+from ..github import (
+    MAINTAINERS_FILE,
+    PULL_REQUEST_TEMPLATE,
+    OrgAPI,
+    RepositoryAPI,
+    _local_file,
+    apply_changes,
+    prefetch_state,
+    prefetch_teams,
+)
+from ..httpcache import CachingAdapter, HTTPCache
+from ..plan import dump_plan, load_plan
+from ..pool import run_tasks
+from ..ratelimit import RateLimitAdapter, RateLimiter
+from ..syncstate import SyncState, config_fingerprint
+from ..tracing import span
+from ..transport import wrap_adapters
+from .stats import instrument_session, stats_option
 
 
-@cli.group()
+@click.group()
 @click.option("--token", "-t", help="GitHub token", prompt=True)
+@click.option(
+    "--no-cache",
+    help="Do not use the HTTP cache.",
+    is_flag=True,
+)
+@click.option(
+    "--cache-size",
+    help="Maximum size of the HTTP cache in MB.",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+)
+@click.option(
+    "--write-interval",
+    help="Minimum number of seconds between write requests.",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+)
+@stats_option
 @click.pass_context
-def github(ctx, token):
+def github(ctx, token, no_cache=False, cache_size=100, write_interval=1.0, stats=None):
     """Repository management for GitHub."""
-    ctx.obj["client"] = GitHub(token=token)
+    client = GitHub(token=token)
+    instrument_session(ctx, client.session, stats)
+    limiter = RateLimiter(write_interval=write_interval)
+    wrap_adapters(client.session, lambda adapter: RateLimitAdapter(limiter, adapter))
+    if not no_cache:
+        httpcache = HTTPCache(
+            os.path.join(ctx.obj["cache_dir"], "github"),
+            max_size=cache_size * 1024 * 1024,
+        )
+        wrap_adapters(
+            client.session, lambda adapter: CachingAdapter(httpcache, adapter)
+        )
+    ctx.obj["client"] = client
+    ctx.obj["cache"] = ResourceCache()
+
+
+jobs_option = click.option(
+    "--jobs",
+    "-j",
+    help="Number of repositories or teams to process concurrently.",
+    type=click.IntRange(min=1),
+    default=1,
+)
+
+prefetch_option = click.option(
+    "--prefetch/--no-prefetch",
+    help="Read the state of all repositories and teams in bulk with GraphQL.",
+    default=True,
+)
+
+commit_message_option = click.option(
+    "--commit-message",
+    help="Message of the commits writing the MAINTAINERS file and pull "
+    "request template (one commit per repository).",
+    default=None,
+)
+
+
+def _prefetch(gh, cache, repositories, teams=False):
+    """Prefetch repository state, falling back to per repository reads."""
+    try:
+        prefetch_state(gh, cache, repositories, teams=teams)
+    except Exception as e:
+        click.secho(
+            "Failed to prefetch state ({}), reading it per repository".format(e),
+            fg="yellow",
+            err=True,
+        )
+
+
+def _prefetch_teams(gh, cache, org):
+    """Prefetch the teams of an organisation, falling back to per team reads."""
+    try:
+        prefetch_teams(gh, cache, org.name)
+    except Exception as e:
+        click.secho(
+            "Failed to prefetch {} teams ({}), reading them per team".format(
+                org.name, e
+            ),
+            fg="yellow",
+            err=True,
+        )
+
+
+def _config_fingerprint(repo, with_maintainers_file, with_pull_template):
+    """Fingerprint the configuration of a repository for repos-configure."""
+    options = dict(
+        with_maintainers_file=with_maintainers_file,
+        with_pull_template=with_pull_template,
+    )
+    if with_pull_template:
+        # The local template is part of the configuration.
+        options["pull_template_sha"] = _local_file(PULL_REQUEST_TEMPLATE)[1]
+    return config_fingerprint(repo, **options)
+
+
+def _reinvitation_message(login, org, reason):
+    return "Invitation of {} to {} failed ({}), inviting again".format(
+        login, org, reason
+    )
+
+
+def _configure_repository(
+    gh,
+    cache,
+    repo,
+    messages,
+    with_maintainers_file,
+    with_pull_template,
+    commit_message=None,
+):
+    """Configure a single repository.
+
+    :param messages: List the produced messages are appended to, so they are
+        kept if configuring fails midway.
+    :returns: Whether the repository was updated.
+    """
+    messages.append("Configuring {}".format(repo.slug))
+    updated = False
+    repoapi = RepositoryAPI(gh, conf=repo, cache=cache, commit_message=commit_message)
+    if repoapi.update_settings():
+        messages.append("Updated settings")
+        updated = True
+    with span("team", "operation"):
+        changes = repoapi.diff_team()
+        orgapi = OrgAPI(gh, conf=repo.org, cache=cache)
+        for login, reason in orgapi.reinvitations(changes).items():
+            messages.append(_reinvitation_message(login, repo.org.name, reason))
+        if repoapi.apply(changes):
+            messages.append("Updated maintainer team")
+            updated = True
+    if repoapi.update_branch_protection():
+        messages.append("Updated branch protection")
+        updated = True
+    if with_maintainers_file:
+        messages.append("Checking MAINTAINERS file")
+    if with_pull_template:
+        messages.append("Checking pull request template")
+    if with_maintainers_file or with_pull_template:
+        files = repoapi.update_files(
+            maintainers_file=with_maintainers_file,
+            pull_req_template=with_pull_template,
+        )
+        if MAINTAINERS_FILE in files:
+            messages.append("Updated MAINTAINERS file")
+        if PULL_REQUEST_TEMPLATE in files:
+            messages.append("Updated pull request template")
+        updated = updated or bool(files)
+    return updated
 
 
 @github.command("repos-configure")
 @click.option("--with-maintainers-file", is_flag=True)
 @click.option("--with-pull-template", is_flag=True)
+@click.option(
+    "--full",
+    help="Configure all repositories, even if unchanged since the last run.",
+    is_flag=True,
+)
+@commit_message_option
+@jobs_option
+@prefetch_option
 @click.pass_context
-def github_repo_configure(ctx, with_maintainers_file=False, with_pull_template=False):
-    """Configure GitHub repositories."""
+def github_repo_configure(
+    ctx,
+    with_maintainers_file=False,
+    with_pull_template=False,
+    full=False,
+    commit_message=None,
+    jobs=1,
+    prefetch=True,
+):
+    """Configure GitHub repositories.
+
+    Repositories whose configuration and remote state did not change since
+    the last successful run are skipped, unless --full is given. Remote
+    state is only known when prefetched, otherwise all repositories are
+    configured.
+    """
     conf = ctx.obj["config"]
     gh = ctx.obj["client"]
+    cache = ctx.obj["cache"]
+    repositories = conf.repositories
+    syncstate = SyncState(os.path.join(ctx.obj["cache_dir"], "github-sync.json"))
+
+    if prefetch:
+        # The team snapshot also indexes pending invitations once per
+        # organisation for the repository teams.
+        _prefetch(gh, cache, repositories, teams=True)
+
+    fingerprints = {}
+    pending = []
+    for repo in repositories:
+        fingerprints[repo.slug] = (
+            _config_fingerprint(repo, with_maintainers_file, with_pull_template),
+            RepositoryAPI(gh, conf=repo, cache=cache).remote_fingerprint(),
+        )
+        if full or not syncstate.unchanged(repo.slug, *fingerprints[repo.slug]):
+            pending.append(repo)
 
-    for repo in conf.repositories:
-        click.echo("Configuring {}".format(repo.slug))
-        repoapi = RepositoryAPI(gh, conf=repo)
-        if repoapi.update_settings():
-            click.echo("Updated settings")
-        if repoapi.update_team():
-            click.echo("Updated maintainer team")
-        if repoapi.update_branch_protection():
-            click.echo("Updated branch protection")
-        if with_maintainers_file:
-            click.echo("Checking MAINTAINERS file")
-            if repoapi.update_maintainers_file():
-                click.echo("Updated MAINTAINERS file")
-        if with_pull_template:
-            click.echo("Checking pull request template")
-            if repoapi.update_pull_req_template():
-                click.echo("Updated pull request template")
+    messages = {}
+
+    def configure(repo):
+        messages[repo.slug] = []
+        with span(repo.slug, "repository"):
+            return _configure_repository(
+                gh,
+                cache,
+                repo,
+                messages[repo.slug],
+                with_maintainers_file,
+                with_pull_template,
+                commit_message=commit_message,
+            )
+
+    failed = []
+    total = 0
+    for res in run_tasks(configure, pending, jobs=jobs):
+        total += 1
+        slug = res.item.slug
+        # Messages of a failed repository show the changes made before.
+        for message in messages.pop(slug):
+            click.echo(message)
+        if res.error is None:
+            if res.value:
+                # Our own changes moved the remote state, so the repository
+                # is checked again (and recorded if in sync) on the next run.
+                syncstate.forget(slug)
+            else:
+                syncstate.record(slug, *fingerprints[slug])
+        else:
+            failed.append(slug)
+            syncstate.forget(slug)
+            click.secho("Failed: {}".format(res.error), fg="red")
+    syncstate.save()
+
+    click.secho(
+        "Configured {} repositories ({} failed, {} unchanged)".format(
+            total, len(failed), len(repositories) - len(pending)
+        ),
+        fg="red" if failed else "green",
+    )
+    for slug in failed:
+        click.secho(slug, fg="red")
+    if failed:
+        ctx.exit(1)
+
+
+@github.command("plan")
+@click.option("--with-teams", help="Include organisation teams.", is_flag=True)
+@click.option("--with-maintainers-file", is_flag=True)
+@click.option("--with-pull-template", is_flag=True)
+@click.option(
+    "--output",
+    "-o",
+    help="Plan file (defaults to standard output).",
+    type=click.File("w"),
+    default="-",
+)
+@jobs_option
+@prefetch_option
+@click.pass_context
+def github_plan(
+    ctx,
+    output,
+    with_teams=False,
+    with_maintainers_file=False,
+    with_pull_template=False,
+    jobs=1,
+    prefetch=True,
+):
+    """Plan changes without applying them.
+
+    Compares the configuration with the actual state of repositories (and
+    teams) and writes the changes needed as a JSON plan, which can be applied
+    with the apply command.
+    """
+    conf = ctx.obj["config"]
+    gh = ctx.obj["client"]
+    cache = ctx.obj["cache"]
+    repositories = conf.repositories
+
+    if prefetch:
+        _prefetch(gh, cache, repositories)
+
+    changes = []
+    if with_teams:
+        for org in conf.organisations:
+            if prefetch:
+                _prefetch_teams(gh, cache, org)
+            orgapi = OrgAPI(gh, conf=org, cache=cache)
+            changes.extend(orgapi.diff_teams(conf.org_teams(org.name), jobs=jobs))
+
+    def diff(repo):
+        with span(repo.slug, "repository"):
+            repoapi = RepositoryAPI(gh, conf=repo, cache=cache)
+            changes = repoapi.diff_settings()
+            if not with_teams:
+                # Repository teams are already part of the organisation teams.
+                changes.extend(repoapi.diff_team())
+            changes.extend(repoapi.diff_branch_protection())
+            if with_maintainers_file:
+                changes.extend(repoapi.diff_maintainers_file())
+            if with_pull_template:
+                changes.extend(repoapi.diff_pull_req_template())
+            return changes
+
+    failed = []
+    for res in run_tasks(diff, repositories, jobs=jobs):
+        if res.error is None:
+            changes.extend(res.value)
+        else:
+            failed.append(res.item.slug)
+            click.secho(
+                "Failed to plan {}: {}".format(res.item.slug, res.error),
+                fg="red",
+                err=True,
+            )
+
+    # Remove duplicates (e.g. a team shared by several repositories).
+    unique = {}
+    for change in changes:
+        unique.setdefault(json.dumps(change.to_dict(), sort_keys=True), change)
+    changes = list(unique.values())
+
+    for change in changes:
+        click.echo(str(change), err=True)
+    click.secho(
+        "Planned {} changes".format(len(changes)),
+        fg="yellow" if changes else "green",
+        err=True,
+    )
+    dump_plan(changes, output)
+    if failed:
+        ctx.exit(1)
+
+
+@github.command("apply")
+@click.argument("plan", type=click.File("r"))
+@commit_message_option
+@jobs_option
+@click.pass_context
+def github_apply(ctx, plan, commit_message=None, jobs=1):
+    """Apply a plan created with the plan command."""
+    gh = ctx.obj["client"]
+    cache = ctx.obj["cache"]
+
+    total = 0
+    failed = 0
+    for res in apply_changes(
+        gh, cache, load_plan(plan), jobs=jobs, commit_message=commit_message
+    ):
+        total += len(res.item)
+        for change in res.item:
+            click.echo(str(change))
+        if res.error is not None:
+            failed += len(res.item)
+            click.secho("Failed: {}".format(res.error), fg="red")
+
+    click.secho(
+        "Applied {} changes ({} failed)".format(total, failed),
+        fg="red" if failed else "green",
+    )
+    if failed:
+        ctx.exit(1)
 
 
 @github.command("teams-sync")
+@jobs_option
+@prefetch_option
 @click.pass_context
-def github_teams_sync(ctx):
-    """Synchronize GitHub teams."""
+def github_teams_sync(ctx, jobs=1, prefetch=True):
+    """Synchronize GitHub teams.
+
+    Organisations, and the teams of each organisation, are compared and
+    updated concurrently by up to --jobs workers. Teams are deleted and
+    created before their members and repositories are updated. Users with a
+    pending invitation are not invited again, while users whose invitation
+    expired are reported and invited again.
+    """
     conf = ctx.obj["config"]
     gh = ctx.obj["client"]
+    cache = ctx.obj["cache"]
 
-    for org in conf.organisations:
-        click.echo("Configuring {} teams".format(org.name))
-        orgapi = OrgAPI(gh, conf=org)
-        if orgapi.update_teams([t for t in conf.teams if t.org == org]):
-            click.echo("Updated organisation teams")
+    def diff(org):
+        with span(org.name, "organisation"):
+            if prefetch:
+                _prefetch_teams(gh, cache, org)
+            orgapi = OrgAPI(gh, conf=org, cache=cache)
+            changes = orgapi.diff_teams(conf.org_teams(org.name), jobs=jobs)
+            return changes, orgapi.reinvitations(changes)
+
+    changes = []
+    failed = set()
+    for res in run_tasks(diff, conf.organisations, jobs=jobs):
+        click.echo("Configuring {} teams".format(res.item.name))
+        if res.error is None:
+            changes.extend(res.value[0])
+            for login, reason in res.value[1].items():
+                click.secho(
+                    _reinvitation_message(login, res.item.name, reason), fg="yellow"
+                )
+        else:
+            failed.update(
+                (res.item.name, t.name) for t in conf.org_teams(res.item.name)
+            )
+            click.secho("Failed: {}".format(res.error), fg="red")
+
+    updated = set()
+    for res in apply_changes(gh, cache, changes, jobs=jobs):
+        teams = {(c.org, c.team) for c in res.item}
+        for change in res.item:
+            click.echo(str(change))
+        if res.error is None:
+            updated.update(teams)
+        else:
+            failed.update(teams)
+            click.secho("Failed: {}".format(res.error), fg="red")
+
+    click.secho(
+        "Updated {} teams ({} failed)".format(len(updated - failed), len(failed)),
+        fg="red" if failed else "green",
+    )
+    if failed:
+        ctx.exit(1)
 
 
 @github.command("repos-conf-check")
@@ -90,7 +492,7 @@ def github_repo_list(ctx):
     gh = ctx.obj["client"]
 
     for org in conf.organisations:
-        orgapi = OrgAPI(gh, conf=org)
+        orgapi = OrgAPI(gh, conf=org, cache=ctx.obj["cache"])
 
         ghrepos = set([r.name for r in orgapi.repos()])
         confrepos = set(org.repositories.keys())
@@ -120,7 +522,7 @@ def github_yaml_template(ctx):
 
     for org in conf.organisations:
         click.secho("Fetching data for {}".format(org.name), fg="green")
-        orgapi = OrgAPI(gh, conf=org)
+        orgapi = OrgAPI(gh, conf=org, cache=ctx.obj["cache"])
         data["orgs"][org.name] = orgapi.yaml_template()
 
     click.echo(
@@ -24,13 +24,54 @@
 
 """Command line interface for MetaInvenio."""
 
+import importlib
+import os
+
 import click
 from attrdict import AttrDict
 
 from ..config import ConfigParser
+from ..tracing import Profiler, Tracer, set_tracer
+
+
+class LazyGroup(click.Group):
+    """Group which imports its subcommands only when they are used.
+
+    This avoids importing the GitHub and HTTP clients for commands which do
+    not need them.
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """Initialize group.
+
+        :param lazy_subcommands: Dictionary mapping command names to the
+            import path of the command (``<module>:<attribute>``).
+        """
+        super(LazyGroup, self).__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
 
+    def list_commands(self, ctx):
+        """List commands including lazy ones."""
+        return sorted(
+            super(LazyGroup, self).list_commands(ctx) + list(self.lazy_subcommands)
+        )
 
-@click.group()
+    def get_command(self, ctx, cmd_name):
+        """Get command, importing it if needed."""
+        if cmd_name in self.lazy_subcommands:
+            modname, attr = self.lazy_subcommands[cmd_name].split(":")
+            return getattr(importlib.import_module(modname), attr)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "conf": "metainvenio.cli.conf:conf",
+        "github": "metainvenio.cli.github:github",
+        "pypi": "metainvenio.cli.pypi:pypi",
+    },
+)
 @click.option(
     "--config", "-c", help="Configuration file path.", type=click.File(), required=True
 )
@@ -38,15 +79,73 @@ from ..config import ConfigParser
 @click.option(
     "--repository-type", "-t", help="Repository type", default=None, multiple=True
 )
+@click.option(
+    "--cache-dir",
+    help="Cache directory.",
+    type=click.Path(file_okay=False),
+    envvar="METAINVENIO_CACHE_DIR",
+    default=lambda: os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "metainvenio",
+    ),
+    show_default="$XDG_CACHE_HOME/metainvenio",
+)
+@click.option(
+    "--no-config-cache",
+    help="Do not cache the parsed configuration.",
+    is_flag=True,
+)
+@click.option(
+    "--trace-file",
+    help="Write a trace of operations and requests (Chrome trace format).",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@click.option(
+    "--profile",
+    help="Write CPU profiling statistics (pstats format).",
+    type=click.Path(dir_okay=False, writable=True),
+)
 @click.pass_context
-def cli(ctx, config, repository=None, repository_type=None):
+def cli(
+    ctx,
+    config,
+    repository=None,
+    repository_type=None,
+    cache_dir=None,
+    no_config_cache=False,
+    trace_file=None,
+    profile=None,
+):
     """Management tools for Invenio modules."""
+    if trace_file:
+        tracer = Tracer()
+        set_tracer(tracer)
+
+        def dump_trace():
+            set_tracer(None)
+            with open(trace_file, "w") as fp:
+                tracer.dump(fp)
+
+        ctx.call_on_close(dump_trace)
+    if profile:
+        profiler = Profiler()
+        profiler.start()
+
+        def dump_profile():
+            profiler.stop()
+            profiler.dump(profile)
+
+        ctx.call_on_close(dump_profile)
     ctx.obj = AttrDict(
         {
             "config": ConfigParser(
                 config,
                 repository=repository,
                 repository_type=repository_type,
-            )
+                cache_dir=(
+                    None if no_config_cache else os.path.join(cache_dir, "config")
+                ),
+            ),
+            "cache_dir": cache_dir,
         }
     )
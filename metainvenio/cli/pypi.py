@@ -24,17 +24,86 @@
 
 """PyPI CLI."""
 
+import os
+
 import click
 
-from ..pypi import PyPIAPI
-from .main import cli
+from ..httpcache import CachingAdapter, HTTPCache
+from ..pypi import PYPI_URL, PyPIAPI
+from ..transport import wrap_adapters
+from .stats import instrument_session, stats_option
 
 
-@cli.group()
+@click.group()
+@click.option(
+    "--index-url",
+    help="Base URL of the package index.",
+    envvar="METAINVENIO_PYPI_URL",
+    default=PYPI_URL,
+    show_default=True,
+)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of packages to fetch concurrently.",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+)
+@click.option(
+    "--no-cache",
+    help="Do not use the HTTP cache.",
+    is_flag=True,
+)
+@click.option(
+    "--cache-size",
+    help="Maximum size of the HTTP cache in MB.",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+)
+@click.option(
+    "--cache-ttl",
+    help="Number of seconds cached responses are used without revalidation.",
+    type=click.FloatRange(min=0),
+    default=300,
+    show_default=True,
+)
+@click.option(
+    "--offline",
+    help="Only use cached responses.",
+    is_flag=True,
+)
+@stats_option
 @click.pass_context
-def pypi(ctx):
+def pypi(
+    ctx,
+    index_url=PYPI_URL,
+    jobs=10,
+    no_cache=False,
+    cache_size=100,
+    cache_ttl=300,
+    offline=False,
+    stats=None,
+):
     """Repository management for PyPI."""
-    ctx.obj["client"] = PyPIAPI()
+    if no_cache and offline:
+        raise click.UsageError("--offline requires the HTTP cache.")
+    client = PyPIAPI(url=index_url, pool_size=jobs)
+    instrument_session(ctx, client.client, stats)
+    if not no_cache:
+        httpcache = HTTPCache(
+            os.path.join(ctx.obj["cache_dir"], "pypi"),
+            max_size=cache_size * 1024 * 1024,
+        )
+        wrap_adapters(
+            client.client,
+            lambda adapter: CachingAdapter(
+                httpcache, adapter, ttl=cache_ttl, offline=offline
+            ),
+        )
+    ctx.obj["client"] = client
+    ctx.obj["jobs"] = jobs
 
 
 @pypi.command("latest-release")
@@ -43,9 +112,13 @@ def pypi_latest_release(ctx):
     """Get latest release."""
     conf = ctx.obj["config"]
     pypi = ctx.obj["client"]
+    repositories = conf.repositories
 
-    for repo in conf.repositories:
-        data = pypi.latest_release(repo.name)
+    results = pypi.latest_releases(
+        [repo.name for repo in repositories], jobs=ctx.obj["jobs"]
+    )
+    for repo, res in zip(repositories, results):
+        data = res.value
         if not data:
             click.echo("{}: ".format(repo.slug) + click.style("failed", fg="red"))
         else:
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Request statistics and tracing of HTTP sessions."""
+
+import json
+
+import click
+
+from ..stats import RequestStats, StatsAdapter, TracingAdapter
+from ..tracing import get_tracer
+from ..transport import wrap_adapters
+
+
+def stats_option(f):
+    """Add the ``--stats`` option to a command group."""
+    return click.option(
+        "--stats",
+        help="Print statistics of the HTTP requests on exit.",
+        type=click.Choice(["table", "json"]),
+    )(f)
+
+
+def instrument_session(ctx, session, output_format=None):
+    """Trace and record statistics of the requests of a session.
+
+    Must be called before other adapters are mounted on the session, so the
+    instrumentation sees every request sent over the network. The statistics
+    are printed on standard error when the command exits.
+    """
+    if get_tracer() is not None:
+        wrap_adapters(session, TracingAdapter)
+    if output_format is None:
+        return None
+    stats = RequestStats()
+    wrap_adapters(session, lambda adapter: StatsAdapter(stats, adapter))
+
+    def report():
+        if output_format == "json":
+            click.echo(json.dumps(stats.to_dict(), indent=2), err=True)
+        else:
+            click.echo(stats.format_table(), err=True)
+
+    ctx.call_on_close(report)
+    return stats
@@ -24,58 +24,306 @@
 
 """Configuration file parser."""
 
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
 import yaml
-from attrdict import AttrDict
+
+from . import __version__
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader
+
+CACHE_ENTRIES = 10
+"""Number of resolved configurations kept in the cache directory."""
+
+REPOSITORY_DEFAULTS = {
+    "pypi": True,
+    "branches": ["master"],
+    "i18n": True,
+    "has_issues": True,
+    "has_wiki": False,
+    "allow_merge_commit": False,
+    "allow_rebase_merge": True,
+    "allow_squash_merge": True,
+    "default_branch": "master",
+    "maintainers": [],
+}
+"""Default repository configuration."""
+
+
+def _freeze(value):
+    """Convert lists into tuples."""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class Record(object):
+    """Immutable configuration record.
+
+    Known fields are stored in slots, other keys of the configuration in a
+    dictionary. Records support attribute access as well as ``get()`` and
+    item access like the dictionaries they replace.
+    """
+
+    __slots__ = ("_extra",)
+    _fields = ()
+
+    def __init__(self, **data):
+        """Initialize record."""
+        for field in self._fields:
+            object.__setattr__(self, field, _freeze(data.pop(field, None)))
+        object.__setattr__(self, "_extra", {k: _freeze(v) for k, v in data.items()})
+
+    def __getattr__(self, name):
+        """Get a key which is not a field."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._extra[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        """Prevent modifications."""
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __getstate__(self):
+        """Get state for pickling."""
+        return dict(self.items())
+
+    def __setstate__(self, state):
+        """Restore state when unpickling."""
+        for field in self._fields:
+            object.__setattr__(self, field, state.pop(field))
+        object.__setattr__(self, "_extra", state)
+
+    def __getitem__(self, key):
+        """Get a key like in a dictionary."""
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        """Check if a key is set."""
+        return key in self._fields or key in self._extra
+
+    def get(self, key, default=None):
+        """Get a key with a default like in a dictionary."""
+        return getattr(self, key, default)
+
+    def items(self):
+        """Iterate over keys and values."""
+        for field in self._fields:
+            yield field, getattr(self, field)
+        for item in self._extra.items():
+            yield item
+
+    def __repr__(self):
+        """Representation of the record."""
+        return "<{} {}>".format(type(self).__name__, self.name)
+
+
+class OrgConfig(Record):
+    """Organisation configuration."""
+
+    __slots__ = _fields = ("name", "repositories", "teams")
+
+
+class RepoConfig(Record):
+    """Repository configuration."""
+
+    __slots__ = _fields = (
+        "name",
+        "org",
+        "slug",
+        "type",
+        "state",
+        "description",
+        "url",
+        "team",
+        "maintainers",
+        "branches",
+        "default_branch",
+        "has_issues",
+        "has_wiki",
+        "allow_merge_commit",
+        "allow_rebase_merge",
+        "allow_squash_merge",
+        "pypi",
+        "i18n",
+    )
+
+
+class TeamConfig(Record):
+    """Team configuration."""
+
+    __slots__ = _fields = (
+        "name",
+        "org",
+        "members",
+        "repositories",
+        "permission",
+        "is_repo_team",
+    )
 
 
 class ConfigParser(object):
-    """MetaInvenio configuration file parser."""
+    """MetaInvenio configuration file parser.
 
-    def __init__(self, fp, repository=None, repository_type=None):
+    The configuration is resolved once into organisations, repositories and
+    teams (with defaults applied) and indexed for lookups. If a cache
+    directory is given, the resolved configuration is stored there and
+    reused as long as the file content, the selection and the version of
+    metainvenio are the same.
+    """
+
+    def __init__(self, fp, repository=None, repository_type=None, cache_dir=None):
         """Parse configuration file."""
         self.select_repo = repository
         self.select_type = repository_type
-        self.data = yaml.load(fp) or {}
+        content = fp.read() if hasattr(fp, "read") else fp
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, self._cache_key(content) + ".pickle")
+            if self._load_cache(cache_path):
+                return
+        self.data = yaml.load(content, Loader=SafeLoader) or {}
+        self._load()
+        if cache_path:
+            self._save_cache(cache_path)
 
-    @property
-    def organisations(self):
-        """Iterator over organisations."""
-        for org_name, org in self.data.get("orgs", {}).items():
-            org.update({"name": org_name})
-            yield AttrDict(org)
+    def _cache_key(self, content):
+        """Compute the cache key of a configuration."""
+        if isinstance(content, str):
+            content = content.encode("utf8")
+        key = hashlib.sha256(content)
+        key.update(
+            repr(
+                (
+                    __version__,
+                    tuple(self.select_repo or ()),
+                    tuple(self.select_type or ()),
+                )
+            ).encode("utf8")
+        )
+        return key.hexdigest()
 
-    @property
-    def teams(self):
-        """Iterator over teams."""
-        repos_list = [r.name for r in self.repositories]
-
-        for org in self.organisations:
-            if not self.select_repo:
-                for name, data in org.get("teams", {}).items():
-                    data["org"] = org
-                    data["name"] = name
-                    data["is_repo_team"] = False
-                    data.setdefault("repositories", [])
-                    data.setdefault("permission", "pull")
-                    if data["repositories"] == "*":
-                        data["repositories"] = repos_list
-                    yield AttrDict(data)
-
-        for repo in self.repositories:
+    def _load_cache(self, path):
+        """Load the resolved configuration from the cache."""
+        try:
+            with open(path, "rb") as fp:
+                self.__dict__.update(pickle.load(fp))
+        except Exception:
+            return False
+        try:
+            # Keep recently used entries from being evicted.
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def _save_cache(self, path):
+        """Store the resolved configuration in the cache."""
+        dirpath = os.path.dirname(path)
+        try:
+            os.makedirs(dirpath, exist_ok=True)
+            fd, tmppath = tempfile.mkstemp(dir=dirpath, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump(self.__dict__, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, path)
+            entries = sorted(
+                (
+                    os.path.join(dirpath, name)
+                    for name in os.listdir(dirpath)
+                    if name.endswith(".pickle")
+                ),
+                key=os.path.getmtime,
+                reverse=True,
+            )
+            for entry in entries[CACHE_ENTRIES:]:
+                os.remove(entry)
+        except OSError:
+            pass
+
+    def _load(self):
+        """Resolve and index the configuration."""
+        self._organisations = OrderedDict()
+        self._repositories = OrderedDict()
+        self._teams = []
+        self._team_index = {}
+        self._org_repositories = {}
+        self._org_teams = {}
+        self._type_repositories = {}
+        self._maintainer_repositories = {}
+
+        for org_name, data in self.data.get("orgs", {}).items():
+            self._organisations[org_name] = OrgConfig(name=org_name, **(data or {}))
+            self._org_repositories[org_name] = []
+            self._org_teams[org_name] = []
+
+        for org in self._organisations.values():
+            for repo_name, data in (org.repositories or {}).items():
+                repo = dict(data or {})
+                repo["name"] = repo_name
+                repo["org"] = org
+                repo["slug"] = "{}/{}".format(org.name, repo_name)
+                if not self.is_selected(repo):
+                    continue
+                for key, value in REPOSITORY_DEFAULTS.items():
+                    repo.setdefault(key, value)
+                repo.setdefault("team", "{}-maintainers".format(repo_name))
+                repo.setdefault("url", "https://{}.readthedocs.io".format(repo_name))
+                repo = RepoConfig(**repo)
+                self._repositories[repo.slug] = repo
+                self._org_repositories[org.name].append(repo)
+                self._type_repositories.setdefault(repo.get("type"), []).append(repo)
+                for login in repo.maintainers:
+                    self._maintainer_repositories.setdefault(login, []).append(repo)
+
+        if not self.select_repo:
+            for org in self._organisations.values():
+                repos_list = [r.name for r in self._org_repositories[org.name]]
+                for name, data in (org.teams or {}).items():
+                    team = dict(data or {})
+                    team["org"] = org
+                    team["name"] = name
+                    team["is_repo_team"] = False
+                    team.setdefault("members", [])
+                    team.setdefault("repositories", [])
+                    # Accept "permissions" as used in older configurations.
+                    team.setdefault("permission", team.pop("permissions", "pull"))
+                    if team["repositories"] == "*":
+                        team["repositories"] = repos_list
+                    self._add_team(TeamConfig(**team))
+
+        for repo in self._repositories.values():
             if not repo.team:
                 continue
-            maintainers = repo.get("maintainers", [])
-            yield AttrDict(
-                {
-                    "name": repo.team,
-                    "members": maintainers,
-                    "org": org,
-                    "repositories": [repo.name],
-                    "permission": "maintain",
-                    "is_repo_team": True,
-                }
+            self._add_team(
+                TeamConfig(
+                    name=repo.team,
+                    members=repo.maintainers,
+                    org=repo.org,
+                    repositories=[repo.name],
+                    permission="maintain",
+                    is_repo_team=True,
+                )
             )
 
+    def _add_team(self, team):
+        """Index a team."""
+        self._teams.append(team)
+        self._team_index.setdefault((team.org.name, team.name), team)
+        self._org_teams[team.org.name].append(team)
+
     def is_selected(self, repo):
         """Determine if repository is selected."""
         if self.select_repo:
@@ -85,27 +333,50 @@ class ConfigParser(object):
         else:
             return True
 
+    @property
+    def organisations(self):
+        """List of organisations."""
+        return list(self._organisations.values())
+
     @property
     def repositories(self):
-        """Iterator over repositories."""
-        for org in self.organisations:
-            for repo_name, repo in org.repositories.items():
-                repo["name"] = repo_name
-                repo["org"] = org
-                repo["slug"] = "{}/{}".format(org.name, repo_name)
-                if self.is_selected(repo):
-                    repo.setdefault("pypi", True)
-                    repo.setdefault("branches", ["master"])
-                    repo.setdefault("i18n", True)
-                    repo.setdefault("has_issues", True)
-                    repo.setdefault("has_wiki", False)
-                    repo.setdefault("allow_merge_commit", False)
-                    repo.setdefault("allow_rebase_merge", True)
-                    repo.setdefault("allow_squash_merge", True)
-                    repo.setdefault("default_branch", "master")
-                    repo.setdefault("team", "{}-maintainers".format(repo_name))
-                    repo.setdefault("maintainers", [])
-                    repo.setdefault(
-                        "url", "https://{}.readthedocs.io".format(repo_name)
-                    )
-                    yield AttrDict(repo)
+        """List of (selected) repositories."""
+        return list(self._repositories.values())
+
+    @property
+    def teams(self):
+        """List of teams."""
+        return list(self._teams)
+
+    def organisation(self, name):
+        """Get an organisation by name."""
+        return self._organisations.get(name)
+
+    def repository(self, slug):
+        """Get a repository by slug (``<org>/<name>``)."""
+        return self._repositories.get(slug)
+
+    def team(self, org, name):
+        """Get a team of an organisation by name."""
+        return self._team_index.get((org, name))
+
+    def org_repositories(self, org):
+        """List repositories of an organisation."""
+        return list(self._org_repositories.get(org, []))
+
+    def org_teams(self, org):
+        """List teams of an organisation."""
+        return list(self._org_teams.get(org, []))
+
+    def type_repositories(self, type_):
+        """List repositories of a given type."""
+        return list(self._type_repositories.get(type_, []))
+
+    def maintainer_repositories(self, login):
+        """List repositories maintained by a user."""
+        return list(self._maintainer_repositories.get(login, []))
+
+    @property
+    def maintainers(self):
+        """Sorted list of all repository maintainers."""
+        return sorted(self._maintainer_repositories)
@@ -24,27 +24,186 @@
 
 """GitHub Maintainer API client."""
 
+import functools
+import hashlib
 import logging
+import os
+import posixpath
 import re
 from json import dumps
 
-from attrdict import AttrDict
 from github3.decorators import requires_auth
 from github3.exceptions import NotFoundError
-from github3.orgs import Organization, Team
-from github3.repos import Repository
+from github3.orgs import Invitation, Organization, Team
+from github3.repos import Repository, ShortRepository
 from github3.repos.branch import Branch
+from github3.users import ShortUser
+
+from .cache import ResourceCache
+from .config import OrgConfig, RepoConfig, TeamConfig
+from .graphql import GraphQLClient, StateFetcher
+from .pagination import paginate
+from .plan import TEAM_LIFECYCLE_OPERATIONS, Change, sort_changes
+from .pool import TaskResult, run_tasks
+from .syncstate import fingerprint
+from .tracing import span, traced
 
 LINE_RE = re.compile("(.+)")
 
+MAINTAINERS_FILE = "MAINTAINERS"
+PULL_REQUEST_TEMPLATE = ".github/pull_request_template.md"
+
+COMMIT_MESSAGE = "global: managed files update"
+"""Message of commits updating several managed files."""
+
+TEAM_REPOSITORIES_HEADERS = {"Accept": "application/vnd.github.ironman-preview+json"}
+"""Headers of team repository listings (with the team's permissions)."""
+
+PERMISSIONS = ("pull", "triage", "push", "maintain", "admin")
+"""Repository permissions, from the lowest to the highest."""
+
 logger = logging.getLogger(__name__)
 
 
+def git_blob_sha(content):
+    """Compute the git blob SHA of some content (as GitHub reports it)."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_local_file(path, mtime, size):
+    with open(path, "r") as f:
+        text = f.read()
+    return text, git_blob_sha(text.encode("utf8"))
+
+
+def _local_file(path):
+    """Read a local file as a ``(text, blob SHA)`` tuple.
+
+    The file is only read again if it was modified.
+    """
+    st = os.stat(path)
+    return _read_local_file(path, st.st_mtime_ns, st.st_size)
+
+
+def has_permission(actual, permission):
+    """Check if a permission includes another permission."""
+    if actual not in PERMISSIONS:
+        return False
+    return PERMISSIONS.index(actual) >= PERMISSIONS.index(permission)
+
+
+def prefetch_state(client, cache, repositories, batch_size=25, teams=False):
+    """Fetch the state of repositories and teams in bulk with GraphQL.
+
+    The state is stored in the resource cache where :class:`RepositoryAPI` and
+    :class:`OrgAPI` use it instead of reading through the REST API.
+
+    :param teams: Fetch a full snapshot of the teams of each organisation (see
+        :func:`prefetch_teams`) instead of only their repositories.
+    """
+    fetcher = StateFetcher(
+        GraphQLClient(client.session),
+        files=(MAINTAINERS_FILE, PULL_REQUEST_TEMPLATE),
+        batch_size=batch_size,
+    )
+    slugs = [(r.org.name, r.name) for r in repositories]
+    with span("prefetch repositories", "prefetch", count=len(slugs)):
+        states = fetcher.repositories(slugs)
+    for (owner, name), state in states.items():
+        if state is not None:
+            cache.set(("repo", owner, name, "state"), state)
+    for org in sorted({owner for owner, _ in slugs}):
+        with span("prefetch teams", "prefetch", org=org):
+            if teams:
+                cache.set(("org", org, "state"), fetcher.organization(org))
+            else:
+                cache.set(
+                    ("org", org, "team-repositories"), fetcher.team_repositories(org)
+                )
+
+
+def prefetch_teams(client, cache, org):
+    """Fetch a snapshot of the teams of an organisation.
+
+    The snapshot is stored in the resource cache where :class:`OrgAPI` uses
+    it instead of listing the members and repositories of each team.
+    """
+    fetcher = StateFetcher(GraphQLClient(client.session))
+    with span("prefetch teams", "prefetch", org=org):
+        cache.set(("org", org, "state"), fetcher.organization(org))
+
+
+def apply_changes(client, cache, changes, jobs=1, commit_message=None):
+    """Apply a list of changes.
+
+    Teams are deleted and created first, then the members and repositories
+    of each team are updated, and finally the repositories are updated.
+    Teams and repositories are updated concurrently by up to ``jobs``
+    workers. The members and repositories of a team which failed to be
+    created are not updated.
+
+    :param commit_message: Message of the commits writing files, see
+        :class:`RepositoryAPI`.
+
+    :returns: Iterator of :class:`~metainvenio.pool.TaskResult`, one per
+        team or repository, with the list of its changes as the item.
+    """
+    phases = ({}, {}, {})
+    for change in sort_changes(changes):
+        if change.op in TEAM_LIFECYCLE_OPERATIONS:
+            phases[0].setdefault((change.org, change.team), []).append(change)
+        elif change.repository is None:
+            phases[1].setdefault((change.org, change.team), []).append(change)
+        else:
+            phases[2].setdefault((change.org, change.repository), []).append(change)
+
+    def apply(group):
+        change = group[0]
+        if change.repository is None:
+            api = OrgAPI(client, conf=OrgConfig(name=change.org), cache=cache)
+        else:
+            conf = RepoConfig(name=change.repository, org=OrgConfig(name=change.org))
+            api = RepositoryAPI(
+                client, conf=conf, cache=cache, commit_message=commit_message
+            )
+        with span(change.target, "target"):
+            return api.apply(group)
+
+    failed = set()
+    for phase, groups in enumerate(phases):
+        pending = []
+        for key, group in groups.items():
+            if phase == 1 and key in failed:
+                error = RuntimeError("Team {} was not created".format(key[1]))
+                yield TaskResult(group, None, error)
+            else:
+                pending.append(group)
+        for res in run_tasks(apply, pending, jobs=jobs):
+            if phase == 0 and res.error is not None:
+                failed.add((res.item[0].org, res.item[0].team))
+            yield res
+
+
 #
 # GitHub API Extensions.
 #
 class ExtendedOrganization(Organization):
-    """Organistaion extension."""
+    """Organistaion extension.
+
+    Listings fetch all their pages concurrently, see
+    :func:`~metainvenio.pagination.paginate`.
+    """
+
+    def repositories(self):
+        """Iterate over the repositories of this organization."""
+        url = self._build_url("repos", base_url=self._api)
+        return paginate(self, url, ShortRepository)
+
+    def teams(self):
+        """Iterate over the teams of this organization."""
+        url = self._build_url("teams", base_url=self._api)
+        return paginate(self, url, ExtendedTeam)
 
     @requires_auth
     def create_team(self, name, repo_names=[], privacy="closed"):
@@ -54,9 +213,29 @@ class ExtendedOrganization(Organization):
         json = self._json(self._post(url, data), 201)
         return self._instance_or_null(Team, json)
 
+    @requires_auth
+    def failed_invitations(self):
+        """Iterate over invitations which failed or expired."""
+        url = self._build_url("failed_invitations", base_url=self._api)
+        return paginate(self, url, Invitation)
+
 
 class ExtendedTeam(Team):
-    """Team extension."""
+    """Team extension.
+
+    Listings fetch all their pages concurrently, see
+    :func:`~metainvenio.pagination.paginate`.
+    """
+
+    def members(self):
+        """Iterate over the members of this team."""
+        url = self._build_url("members", base_url=self._api)
+        return paginate(self, url, ShortUser)
+
+    def repositories(self):
+        """Iterate over the repositories of this team (with permissions)."""
+        url = self._build_url("repos", base_url=self._api)
+        return paginate(self, url, ShortRepository, headers=TEAM_REPOSITORIES_HEADERS)
 
     @requires_auth
     def add_repository(self, repository, permission="pull"):
@@ -65,6 +244,12 @@ class ExtendedTeam(Team):
         url = self._build_url("repos", repository, base_url=self._api)
         return self._boolean(self._put(url, data=dumps(data)), 204, 404)
 
+    @requires_auth
+    def invitations(self):
+        """Iterate over pending invitations to this team."""
+        url = self._build_url("invitations", base_url=self._api)
+        return paginate(self, url, Invitation)
+
 
 class ExtendedRepository(Repository):
     """Branch extension."""
@@ -106,6 +291,29 @@ class ExtendedRepository(Repository):
             return True
         return False
 
+    @requires_auth
+    def commit_files(self, branch, files, message, parent, base_tree):
+        """Commit several files to a branch at once with the Git Data API.
+
+        :param files: Dictionary mapping paths to their new content.
+        :param parent: SHA of the commit the branch points to.
+        :param base_tree: SHA of the tree of the parent commit.
+        :returns: SHA of the new commit.
+        """
+        tree = [
+            {"path": path, "mode": "100644", "type": "blob", "content": content}
+            for path, content in sorted(files.items())
+        ]
+        url = self._build_url("git", "trees", base_url=self._api)
+        json = self._json(self._post(url, {"tree": tree, "base_tree": base_tree}), 201)
+        url = self._build_url("git", "commits", base_url=self._api)
+        data = {"message": message, "tree": json["sha"], "parents": [parent]}
+        sha = self._json(self._post(url, data), 201)["sha"]
+        # Fails if the branch moved since the parent was read.
+        url = self._build_url("git", "refs", "heads", branch, base_url=self._api)
+        self._json(self._patch(url, data=dumps({"sha": sha, "force": False})), 200)
+        return sha
+
 
 class ExtendedBranch(Branch):
     """Branch extension."""
@@ -134,6 +342,75 @@ class ExtendedBranch(Branch):
             self._put(url, data=dumps(data), headers=self.PREVIEW_HEADERS), 200
         )
 
+    def current_protection(self):
+        """Get the branch protection as returned by GitHub (``None`` if none)."""
+        url = self._build_url("protection", base_url=self._api)
+        try:
+            return self._json(self._get(url, headers=self.PREVIEW_HEADERS), 200)
+        except NotFoundError:
+            return None
+
+
+def _slugify(name):
+    """Convert a team name into its slug."""
+    return re.sub(r"[^a-z0-9_]+", "-", name.lower()).strip("-")
+
+
+def normalize_protection(protection):
+    """Normalize branch protection for comparison.
+
+    Accepts the payload sent by :meth:`ExtendedBranch.protect`, the branch
+    protection returned by the REST API or a GraphQL branch protection rule
+    and reduces them to the settings managed by metainvenio. Dismissal
+    restrictions are ignored, since GitHub only stores them together with
+    required pull request reviews.
+    """
+    if protection is None:
+        return None
+    if "pattern" in protection:
+        # GraphQL branch protection rule
+        restrictions = None
+        if protection["restrictsPushes"]:
+            actors = [n["actor"] or {} for n in protection["pushAllowances"]["nodes"]]
+            restrictions = (
+                sorted(a["login"] for a in actors if "login" in a),
+                sorted(a["slug"] for a in actors if "slug" in a),
+            )
+        return {
+            "required_status_checks": protection["requiresStatusChecks"],
+            "required_pull_request_reviews": protection["requiresApprovingReviews"],
+            "enforce_admins": protection["isAdminEnforced"],
+            "required_linear_history": protection["requiresLinearHistory"],
+            "restrictions": restrictions,
+        }
+
+    def enabled(value):
+        # REST API returns objects with an "enabled" key, payloads booleans.
+        if isinstance(value, dict):
+            return bool(value.get("enabled"))
+        return bool(value)
+
+    restrictions = protection.get("restrictions")
+    if restrictions is not None:
+        restrictions = (
+            sorted(
+                u["login"] if isinstance(u, dict) else u for u in restrictions["users"]
+            ),
+            sorted(
+                t["slug"] if isinstance(t, dict) else _slugify(t)
+                for t in restrictions["teams"]
+            ),
+        )
+    return {
+        "required_status_checks": bool(protection.get("required_status_checks")),
+        "required_pull_request_reviews": bool(
+            protection.get("required_pull_request_reviews")
+        ),
+        "enforce_admins": enabled(protection.get("enforce_admins")),
+        "required_linear_history": enabled(protection.get("required_linear_history")),
+        "restrictions": restrictions,
+    }
+
 
 #
 # Wrapper classes for GitHub API.
@@ -141,10 +418,15 @@ class ExtendedBranch(Branch):
 class GitHubAPI(object):
     """Base class for GitHub wrapper API classes."""
 
-    def __init__(self, client, conf=None):
-        """Initialize GitHub API."""
+    def __init__(self, client, conf=None, cache=None):
+        """Initialize GitHub API.
+
+        :param cache: A :class:`~metainvenio.cache.ResourceCache` shared by all
+            API objects of a run, so each remote object is fetched only once.
+        """
         self.conf = conf
         self.gh = client
+        self.cache = ResourceCache() if cache is None else cache
 
 
 class OrgAPI(GitHubAPI):
@@ -153,109 +435,262 @@ class OrgAPI(GitHubAPI):
     @property
     def _ghorg(self):
         """Get the organisation client."""
-        org = self.gh.organization(self.conf.name)
-        return ExtendedOrganization(org.as_dict(), session=org.session)
+
+        def fetch():
+            org = self.gh.organization(self.conf.name)
+            return ExtendedOrganization(org.as_dict(), session=org.session)
+
+        return self.cache.get(("org", self.conf.name), fetch)
 
     def repos(self):
         """List repositories."""
         return self._ghorg.repositories()
 
+    @property
+    def _teams_index(self):
+        """Organisation teams indexed by name (listed once per run)."""
+
+        def fetch():
+            return {t.name: t for t in self._ghorg.teams()}
+
+        return self.cache.get(("org", self.conf.name, "teams"), fetch)
+
     def teams(self):
         """Get current organisation teams."""
-        return (
-            ExtendedTeam(t.as_dict(), session=t.session) for t in self._ghorg.teams()
-        )
+        return iter(list(self._teams_index.values()))
+
+    def team(self, name):
+        """Get an organisation team by name or ``None`` if it does not exist."""
+        return self._teams_index.get(name)
 
     def create_team(self, t):
         """Create a new GitHub team."""
         team = self._ghorg.create_team(
             t.name,
-            repo_names=t.repositories,
+            repo_names=["{}/{}".format(self.conf.name, r) for r in t.repositories],
         )
-        return ExtendedTeam(team.as_dict(), session=team.session)
+        team = ExtendedTeam(team.as_dict(), session=team.session)
+        self._teams_index[team.name] = team
+        return team
+
+    def delete_team(self, team):
+        """Delete a GitHub team."""
+        team.delete()
+        self._teams_index.pop(team.name, None)
+
+    def _change(self, op, team, **params):
+        return Change(op, self.conf.name, team=team, params=params)
+
+    def _team_state(self, name):
+        """Get the prefetched state of a team (if available)."""
+        state = self.cache.lookup(("org", self.conf.name, "state"))
+        if state is not None:
+            return state.teams.get(name)
+        return None
+
+    def _team_members(self, team):
+        """Get the logins of the members of a team."""
+        state = self._team_state(team.name)
+        if state is not None:
+            return state.members
+        return {m.login for m in team.members()}
+
+    def _team_invitations(self, team):
+        """Get the logins of the users with a pending invitation to a team."""
+        state = self._team_state(team.name)
+        if state is not None:
+            return state.invitations
+        return {i.login for i in team.invitations() if i.login}
+
+    def expired_invitations(self):
+        """Get the failed or expired invitations (listed once per run).
+
+        :returns: Dictionary mapping logins to the reason of the failure.
+        """
+
+        def fetch():
+            return {
+                i.login: i.as_dict().get("failed_reason") or "expired"
+                for i in self._ghorg.failed_invitations()
+                if i.login
+            }
+
+        return self.cache.get(("org", self.conf.name, "failed-invitations"), fetch)
+
+    def reinvitations(self, changes):
+        """Get the users invited again by changes after a failed invitation.
+
+        :returns: Dictionary mapping logins to the reason of the failure.
+        """
+        invited = {c.params["login"] for c in changes if c.op == "invite_member"}
+        if not invited:
+            return {}
+        expired = self.expired_invitations()
+        return {u: expired[u] for u in sorted(invited) if u in expired}
+
+    def _team_repositories(self, team):
+        """Get the repositories of a team and the team's permission on them."""
+        state = self._team_state(team.name)
+        if state is not None:
+            return state.repositories
+        state = self.cache.lookup(("org", self.conf.name, "team-repositories"))
+        if state is not None and team.name in state:
+            return state[team.name]
+        return {
+            r.name: next(
+                (p for p in reversed(PERMISSIONS) if r.permissions.get(p)), None
+            )
+            for r in team.repositories()
+        }
 
-    @staticmethod
-    def sync_team_members(team, members):
-        """Sync team members."""
-        updated = False
-        current = {m.login for m in team.members()}
+    def diff_team_members(self, name, current, members, pending=()):
+        """Compute changes to the members of a team.
+
+        :param pending: Logins of users already invited to the team. They are
+            not invited again, and their invitation is cancelled if they
+            should not be members.
+        """
         expected = set(members)
-        if expected != current:
-            # Add/invite members
-            for m in expected - current:
-                team.invite(m)
-                updated = True
-            # Remove members
-            for m in current - expected:
-                team.revoke_membership(m)
-                updated = True
-        return updated
+        current = set(current)
+        pending = set(pending) - current
+        changes = [
+            self._change("invite_member", name, login=m)
+            for m in sorted(expected - current - pending)
+        ]
+        changes.extend(
+            self._change("revoke_member", name, login=m)
+            for m in sorted((current | pending) - expected)
+        )
+        return changes
 
-    def sync_team_repositories(self, team, permission, repositories):
-        """Synchronize list of repositories for team."""
-        updated = False
-        ghrepos = {r.name: r for r in team.repositories()}
+    def diff_team_repositories(self, name, current, permission, repositories):
+        """Compute changes to the repositories of a team.
 
-        current = set(ghrepos.keys())
+        :param current: Dictionary of current repository names and the
+            team's permission on them.
+        """
+        changes = []
         expected = set(repositories)
-        old = current - expected
-        new = expected - current
-        existing = current & expected
-
-        for r in old:
-            team.remove_repository(ghrepos[r].full_name)
-            updated = True
-
-        for r in new:
-            slug = "{}/{}".format(self.conf.name, r)
-            team.add_repository(slug, permission=permission)
-            updated = True
-
-        for r in existing:
-            repo = ghrepos[r]
-            if not repo.permissions.get(permission, False):
-                team.add_repository(repo.full_name, permission=permission)
-                updated = True
+        for r in sorted(set(current) - expected):
+            changes.append(self._change("remove_team_repository", name, repository=r))
+        for r in sorted(expected):
+            if r not in current or not has_permission(current[r], permission):
+                changes.append(
+                    self._change(
+                        "add_team_repository",
+                        name,
+                        repository=r,
+                        permission=permission,
+                    )
+                )
+        return changes
+
+    def diff_team(self, t):
+        """Compute changes to a team (creating it if needed)."""
+        with span("diff team", "operation", team=t.name):
+            team = self.team(t.name)
+            changes = []
+            if team is None:
+                changes.append(
+                    self._change(
+                        "create_team", t.name, repositories=list(t.repositories)
+                    )
+                )
+                # New teams get read access to the repositories they're created
+                # with.
+                members, repositories = set(), {r: "pull" for r in t.repositories}
+                pending = set()
+            else:
+                members = self._team_members(team)
+                pending = self._team_invitations(team)
+                repositories = self._team_repositories(team)
+            changes.extend(
+                self.diff_team_members(t.name, members, t.members, pending=pending)
+            )
+            changes.extend(
+                self.diff_team_repositories(
+                    t.name, repositories, t.permission, t.repositories
+                )
+            )
+            return changes
+
+    def diff_teams(self, teams, jobs=1):
+        """Compute changes to the organisation teams."""
+        teams = list(teams)
+        expected = {t.name for t in teams}
+        changes = [
+            self._change("delete_team", t.name)
+            for t in sorted(self.teams(), key=lambda t: t.name)
+            if t.name not in expected
+        ]
+        for res in run_tasks(self.diff_team, teams, jobs=jobs):
+            if res.error is not None:
+                raise res.error
+            changes.extend(res.value)
+        return changes
+
+    def apply(self, changes):
+        """Apply team changes and return if anything was changed."""
+        for change in sort_changes(changes):
+            with span(change.op, "change", team=change.team):
+                getattr(self, "_apply_" + change.op)(change.team, **change.params)
+        return bool(changes)
+
+    def _apply_delete_team(self, name):
+        self.delete_team(self.team(name))
+        self._invalidate_team(name)
+
+    def _apply_create_team(self, name, repositories):
+        self.create_team(TeamConfig(name=name, repositories=repositories))
+
+    def _apply_invite_member(self, name, login):
+        self.team(name).invite(login)
+        self._invalidate_team(name)
+
+    def _apply_revoke_member(self, name, login):
+        self.team(name).revoke_membership(login)
+        self._invalidate_team(name)
+
+    def _apply_add_team_repository(self, name, repository, permission):
+        slug = "{}/{}".format(self.conf.name, repository)
+        self.team(name).add_repository(slug, permission=permission)
+        self._invalidate_team(name)
+
+    def _apply_remove_team_repository(self, name, repository):
+        slug = "{}/{}".format(self.conf.name, repository)
+        self.team(name).remove_repository(slug)
+        self._invalidate_team(name)
+
+    def _invalidate_team(self, name):
+        state = self.cache.lookup(("org", self.conf.name, "state"))
+        if state is not None:
+            state.teams.pop(name, None)
+        state = self.cache.lookup(("org", self.conf.name, "team-repositories"))
+        if state is not None:
+            state.pop(name, None)
+
+    def sync_team_members(self, team, members):
+        """Sync team members."""
+        return self.apply(
+            self.diff_team_members(
+                team.name,
+                self._team_members(team),
+                members,
+                pending=self._team_invitations(team),
+            )
+        )
 
-        return updated
+    def sync_team_repositories(self, team, permission, repositories):
+        """Synchronize list of repositories for team."""
+        return self.apply(
+            self.diff_team_repositories(
+                team.name, self._team_repositories(team), permission, repositories
+            )
+        )
 
-    def update_teams(self, teams):
+    def update_teams(self, teams, jobs=1):
         """Update organisation teams."""
-        updated = False
-        current_teams = {t.name: t for t in self.teams()}
-        expected_teams = {t.name: t for t in teams}
-
-        # Detect team changes
-        current = set(current_teams.keys())
-        expected = set(expected_teams.keys())
-        old = current - expected
-        new = expected - current
-        existing = current & expected
-
-        # Delete old teams
-        for t in old:
-            team = current_teams[t]
-            team.delete()
-            updated = True
-
-        # Create new teams
-        for t in new:
-            team = expected_teams[t]
-            current_teams[t] = self.create_team(team)
-            updated = True
-
-        # Check existing teams
-        for t in existing | new:
-            expected_team = expected_teams[t]
-            current_team = current_teams[t]
-
-            if self.sync_team_members(current_team, expected_team.members):
-                updated = True
-            if self.sync_team_repositories(
-                current_team, expected_team.permission, expected_team.repositories
-            ):
-                updated = True
-        return updated
+        return self.apply(self.diff_teams(teams, jobs=jobs))
 
     def yaml_template(self):
         """Generate YAML template for organisation."""
@@ -263,41 +698,99 @@ class OrgAPI(GitHubAPI):
 
         repos = data["repositories"]
         for r in self.repos():
-            r = AttrDict(dict(org=self.conf, name=r.name))
-            repos[r.name] = RepositoryAPI(self.gh, conf=r).yaml_template()
+            r = RepoConfig(org=self.conf, name=r.name)
+            repos[r.name] = RepositoryAPI(
+                self.gh, conf=r, cache=self.cache
+            ).yaml_template()
         return data
 
 
 class RepositoryAPI(GitHubAPI):
-    """Repository API."""
+    """Repository API.
+
+    All files changed by one :meth:`apply` are written to the default branch
+    in a single commit.
+    """
+
+    def __init__(self, client, conf=None, cache=None, commit_message=None):
+        """Initialize repository API.
+
+        :param commit_message: Message of the commits writing files. Defaults
+            to the message of the change when a single file is written.
+        """
+        super(RepositoryAPI, self).__init__(client, conf=conf, cache=cache)
+        self.commit_message = commit_message
+
+    @property
+    def _key(self):
+        """Resource cache key of the repository."""
+        return ("repo", self.conf.org.name, self.conf.name)
 
     @property
     def _ghrepo(self):
-        repo = self.gh.repository(self.conf.org.name, self.conf.name)
-        return ExtendedRepository(repo.as_dict(), session=repo.session)
+        def fetch():
+            repo = self.gh.repository(self.conf.org.name, self.conf.name)
+            return ExtendedRepository(repo.as_dict(), session=repo.session)
 
-    def update_settings(self):
-        """Update repository settings."""
-        repo = self._ghrepo
+        return self.cache.get(self._key, fetch)
 
-        is_dirty = any(
-            [
-                repo.description != self.conf.description,
-                repo.homepage != self.conf.url,
-                repo.has_issues != self.conf.has_issues,
-                repo.has_wiki != self.conf.has_wiki,
-                repo.default_branch != self.conf.default_branch,
-                repo.allow_merge_commit != self.conf.allow_merge_commit,
-                repo.allow_rebase_merge != self.conf.allow_rebase_merge,
-                repo.allow_squash_merge != self.conf.allow_squash_merge,
-            ]
-        )
+    def _ghbranch(self, name):
+        """Get a branch of the repository."""
 
-        if not is_dirty:
-            return False
+        def fetch():
+            branch = self._ghrepo.branch(name)
+            return ExtendedBranch(branch.as_dict(), session=branch.session)
 
-        res = repo.edit(
-            self.conf.name,
+        return self.cache.get(self._key + ("branch", name), fetch)
+
+    @property
+    def _state(self):
+        """Repository state prefetched with GraphQL (if available)."""
+        return self.cache.lookup(self._key + ("state",))
+
+    def _change(self, op, **params):
+        return Change(op, self.conf.org.name, repository=self.conf.name, params=params)
+
+    def remote_fingerprint(self):
+        """Fingerprint the prefetched remote state of the repository.
+
+        Covers the settings, branch protection, managed files and the
+        permission of the maintainer team, as well as its members and pending
+        invitations if the teams snapshot was prefetched. Returns ``None`` if
+        the state was not prefetched.
+        """
+        state = self._state
+        if state is None:
+            return None
+        org = self.cache.lookup(("org", self.conf.org.name, "state"))
+        if org is not None:
+            team = org.teams.get(self.conf.team)
+            team = team and {
+                "permission": team.repositories.get(self.conf.name),
+                "members": sorted(team.members),
+                "invitations": sorted(team.invitations),
+            }
+        else:
+            teams = self.cache.lookup(("org", self.conf.org.name, "team-repositories"))
+            team = (teams or {}).get(self.conf.team, {}).get(self.conf.name)
+        return fingerprint(
+            {
+                "updated_at": state.updated_at,
+                "pushed_at": state.pushed_at,
+                "default_branch": state.default_branch,
+                "branch_protection": state.branch_protection,
+                "files": {
+                    path: f.sha if f else None for path, f in state.files.items()
+                },
+                "team": team,
+            }
+        )
+
+    @traced("diff settings")
+    def diff_settings(self):
+        """Compute changes to the repository settings."""
+        repo = self._state or self._ghrepo
+        settings = dict(
             description=self.conf.description,
             homepage=self.conf.url,
             has_issues=self.conf.has_issues,
@@ -307,84 +800,78 @@ class RepositoryAPI(GitHubAPI):
             allow_rebase_merge=self.conf.allow_rebase_merge,
             allow_squash_merge=self.conf.allow_squash_merge,
         )
-        if not res:
-            raise RuntimeError(
-                "Failed to update repository settings for {}".format(self.conf.name)
+        if all(getattr(repo, k) == v for k, v in settings.items()):
+            return []
+        return [self._change("edit_repository", **settings)]
+
+    @traced("diff pull request template")
+    def diff_pull_req_template(self):
+        """Compute changes to the pull request template file."""
+        filepath = PULL_REQUEST_TEMPLATE
+
+        template, sha = _local_file(filepath)
+        if self._file_sha(filepath) == sha:
+            return []
+        return [
+            self._change(
+                "write_file",
+                path=filepath,
+                content=template,
+                message="global: pull request template update",
             )
-        return True
-
-    def update_pull_req_template(self):
-        """Update pull request template file."""
-        filepath = ".github/pull_request_template.md"
-        commit_message = "global: pull request template update"
-
-        content = self._get_dir_contents(filepath)
-        with open(filepath, "r") as f:
-            template = f.read()
-        if content:
-            parsed = self._parse_pull_request_template(content)
-            if parsed == template:
-                return False
-            content.update(commit_message, template)
-        else:
-            self._ghrepo.create_file(filepath, commit_message, template or b"\n")
-        return True
-
-    def update_maintainers_file(self):
-        """Update maintainers file."""
-        maintainers = "\n".join(sorted(self.conf.maintainers)).encode("utf8")
-        commit_message = "global: maintainers update"
-        filepath = "MAINTAINERS"
-
-        contents = self._get_file_contents(filepath)
-        if contents:
-            # File exists, so check contents and update if needed.
-            current_maintainers = self._parse_maintainers_file(contents)
-            if set(current_maintainers) == set(self.conf.maintainers):
-                return False
-            contents.update(commit_message, maintainers)
-        else:
-            self._ghrepo.create_file(filepath, commit_message, maintainers or b"\n")
-        return True
-
-    def update_team(self):
-        """Update repository team."""
-        orgapi = OrgAPI(self.gh, conf=self.conf.org)
-
-        # Find repository team.
-        team = None
-        for t in orgapi.teams():
-            if t.name == self.conf.team:
-                team = t
-
-        # Create if team does not exists.
-        updated = False
-        if team is None:
-            team = orgapi.create_team(
-                AttrDict(
-                    dict(
-                        name=self.conf.team,
-                        repositories=[self.conf.name],
-                        permission="maintain",
-                    )
-                )
+        ]
+
+    @traced("diff MAINTAINERS")
+    def diff_maintainers_file(self):
+        """Compute changes to the maintainers file."""
+        filepath = MAINTAINERS_FILE
+
+        content = "\n".join(sorted(self.conf.maintainers))
+        sha = self._file_sha(filepath)
+        if sha == git_blob_sha(content.encode("utf8")):
+            return []
+        if sha is not None:
+            # Same maintainers may be listed in another order or format.
+            contents = self._get_file_contents(filepath)
+            if contents:
+                current_maintainers = self._parse_maintainers_file(contents)
+                if set(current_maintainers) == set(self.conf.maintainers):
+                    return []
+        return [
+            self._change(
+                "write_file",
+                path=filepath,
+                content=content,
+                message="global: maintainers update",
             )
-            updated = True
-
-        # Sync member/repo list if team exists
-        if orgapi.sync_team_members(team, self.conf.maintainers):
-            updated = True
-        if orgapi.sync_team_repositories(team, "maintain", [self.conf.name]):
-            updated = True
-        return updated
+        ]
+
+    def diff_team(self):
+        """Compute changes to the repository team."""
+        orgapi = OrgAPI(self.gh, conf=self.conf.org, cache=self.cache)
+        return orgapi.diff_team(
+            TeamConfig(
+                name=self.conf.team,
+                members=self.conf.maintainers,
+                repositories=[self.conf.name],
+                permission="maintain",
+                is_repo_team=True,
+            )
+        )
 
-    def update_branch_protection(self):
-        """Update branch protection."""
-        repo = self._ghrepo
+    def _current_protection(self, branch_name):
+        """Get the current protection of a branch."""
+        state = self._state
+        if state is not None:
+            return state.branch_protection.get(branch_name)
+        return self._ghbranch(branch_name).current_protection()
+
+    @traced("diff branch protection")
+    def diff_branch_protection(self):
+        """Compute changes to the branch protection."""
+        changes = []
         for branch_name in self.conf.branches:
-            branch = repo.branch(branch_name)
-            branch = ExtendedBranch(branch.as_dict(), session=branch.session)
-            branch.protect(
+            protection = dict(
                 required_status_checks=None,
                 required_pull_request_reviews=None,
                 required_linear_history=True,
@@ -398,24 +885,154 @@ class RepositoryAPI(GitHubAPI):
                 ),
                 enforce_admins=False,
             )
-        return True
+            current = self._current_protection(branch_name)
+            if normalize_protection(current) != normalize_protection(protection):
+                changes.append(
+                    self._change("protect_branch", branch=branch_name, **protection)
+                )
+        return changes
+
+    def apply(self, changes):
+        """Apply changes and return if anything was changed."""
+        team_changes = [c for c in changes if c.repository is None]
+        if team_changes:
+            OrgAPI(self.gh, conf=self.conf.org, cache=self.cache).apply(team_changes)
+        files = []
+        for change in sort_changes(changes):
+            if change.repository is None:
+                continue
+            if change.op == "write_file":
+                files.append(change)
+                continue
+            with span(change.op, "change"):
+                getattr(self, "_apply_" + change.op)(**change.params)
+        if files:
+            with span("write_files", "change", count=len(files)):
+                self._apply_write_files(files)
+        return bool(changes)
+
+    def _apply_edit_repository(self, **settings):
+        res = self._ghrepo.edit(self.conf.name, **settings)
+        if not res:
+            raise RuntimeError(
+                "Failed to update repository settings for {}".format(self.conf.name)
+            )
+        state = self._state
+        if state is not None:
+            for k, v in settings.items():
+                setattr(state, k, v)
+
+    def _apply_protect_branch(self, branch, **protection):
+        current = self._ghbranch(branch).protect(**protection)
+        self.cache.invalidate(*self._key + ("branch", branch))
+        state = self._state
+        if state is not None:
+            state.branch_protection[branch] = current
+
+    def _apply_write_files(self, changes):
+        messages = []
+        for change in changes:
+            if change.params["message"] not in messages:
+                messages.append(change.params["message"])
+        if self.commit_message:
+            message = self.commit_message
+        elif len(messages) == 1:
+            message = messages[0]
+        else:
+            message = "{}\n\n{}".format(
+                COMMIT_MESSAGE, "\n".join("* " + m for m in messages)
+            )
+        files = {c.params["path"]: c.params["content"] or "\n" for c in changes}
+
+        state = self._state
+        branch = state.default_branch if state is not None else None
+        branch = branch or self._ghrepo.default_branch
+        head = self._ghbranch(branch).as_dict()["commit"]
+        self._ghrepo.commit_files(
+            branch,
+            files,
+            message,
+            parent=head["sha"],
+            base_tree=head["commit"]["tree"]["sha"],
+        )
+        # New commit changes the repository and its branches.
+        self.cache.invalidate(*self._key)
+
+    @traced("settings")
+    def update_settings(self):
+        """Update repository settings."""
+        return self.apply(self.diff_settings())
+
+    @traced("pull request template")
+    def update_pull_req_template(self):
+        """Update pull request template file."""
+        return self.apply(self.diff_pull_req_template())
+
+    @traced("MAINTAINERS")
+    def update_maintainers_file(self):
+        """Update maintainers file."""
+        return self.apply(self.diff_maintainers_file())
+
+    @traced("managed files")
+    def update_files(self, maintainers_file=True, pull_req_template=True):
+        """Update managed files in a single commit.
+
+        :returns: Paths of the updated files.
+        """
+        changes = []
+        if maintainers_file:
+            changes += self.diff_maintainers_file()
+        if pull_req_template:
+            changes += self.diff_pull_req_template()
+        self.apply(changes)
+        return [c.params["path"] for c in changes]
+
+    @traced("team")
+    def update_team(self):
+        """Update repository team."""
+        return self.apply(self.diff_team())
+
+    @traced("branch protection")
+    def update_branch_protection(self):
+        """Update branch protection."""
+        return self.apply(self.diff_branch_protection())
+
+    def _file_sha(self, filepath):
+        """Get the blob SHA of a file or ``None`` if it does not exist.
+
+        The SHA comes from the prefetched state or from a listing of the
+        file's directory, so the content is not downloaded.
+        """
+        state = self._state
+        if state is not None and filepath in state.files:
+            f = state.files[filepath]
+            return f.sha if f else None
+        dirpath = posixpath.dirname(filepath)
+
+        def fetch():
+            try:
+                listing = self._ghrepo.directory_contents(dirpath)
+            except NotFoundError:
+                return {}
+            return {c.path: c.sha for _, c in listing}
+
+        return self.cache.get(self._key + ("dir", dirpath), fetch).get(filepath)
 
     def _get_file_contents(self, filepath):
         """Get content of a file."""
-        contents = self._ghrepo.file_contents(filepath)
+        state = self._state
+        if state is not None and filepath in state.files:
+            f = state.files[filepath]
+            if f is None or f.text is not None:
+                return f
+        try:
+            contents = self._ghrepo.file_contents(filepath)
+        except NotFoundError:
+            return None
         if not bool(contents):
             return None
         return contents
 
-    def _get_dir_contents(self, dirpath):
-        try:
-            directory = self._ghrepo.file_contents(dirpath)
-            if not bool(directory):
-                return None
-            return directory
-        except NotFoundError as e:
-            return None
-
     @staticmethod
     def _parse_maintainers_file(contents):
         """Parse MAINTAINERS file."""
@@ -430,17 +1047,13 @@ class RepositoryAPI(GitHubAPI):
             lines.append(m.group(1))
         return lines
 
-    @staticmethod
-    def _parse_pull_request_template(contents):
-        return contents.decoded.decode("utf8")
-
     def yaml_template(self):
         """Generate a yaml template for a repository."""
         repo = self._ghrepo
         maintainers = []
 
         # Get maintainers from file.
-        contents = self._get_file_contents("MAINTAINERS")
+        contents = self._get_file_contents(MAINTAINERS_FILE)
         if contents:
             maintainers = list(sorted(set(self._parse_maintainers_file(contents))))
 
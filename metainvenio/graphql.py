@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""GitHub GraphQL API client for bulk reads of repository state."""
+
+import json
+from collections import namedtuple
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+PERMISSIONS = {
+    "READ": "pull",
+    "TRIAGE": "triage",
+    "WRITE": "push",
+    "MAINTAIN": "maintain",
+    "ADMIN": "admin",
+}
+"""Mapping of GraphQL repository permissions to REST API permissions."""
+
+
+class GraphQLError(RuntimeError):
+    """GraphQL query error."""
+
+    def __init__(self, errors):
+        """Initialize error from the list of errors in a GraphQL response."""
+        self.errors = errors
+        super(GraphQLError, self).__init__(
+            "; ".join(e.get("message", "") for e in errors)
+        )
+
+
+def graphql_url(base_url):
+    """Get the GraphQL endpoint for a REST API base URL."""
+    base_url = base_url.rstrip("/")
+    if base_url.endswith("/api/v3"):
+        # GitHub Enterprise
+        return base_url[: -len("/v3")] + "/graphql"
+    return base_url + "/graphql"
+
+
+class GraphQLClient(object):
+    """Minimal GitHub GraphQL API client."""
+
+    def __init__(self, session, url=None):
+        """Initialize client.
+
+        :param session: An authenticated ``requests`` session (e.g. the
+            session of a ``github3.GitHub`` client).
+        :param url: GraphQL endpoint. Defaults to the endpoint of the
+            session's ``base_url`` (if any) or GitHub.com.
+        """
+        self.session = session
+        if url is None:
+            base_url = getattr(session, "base_url", None)
+            url = graphql_url(base_url) if base_url else GITHUB_GRAPHQL_URL
+        self.url = url
+
+    def query(self, query, variables=None, allow_not_found=False):
+        """Execute a query and return its data.
+
+        :param allow_not_found: Do not fail on ``NOT_FOUND`` errors (e.g.
+            a missing repository); the corresponding data is ``None``.
+        """
+        res = self.session.post(
+            self.url,
+            data=json.dumps({"query": query, "variables": variables or {}}),
+        )
+        res.raise_for_status()
+        data = res.json()
+        errors = [
+            e
+            for e in data.get("errors") or []
+            if not (allow_not_found and e.get("type") == "NOT_FOUND")
+        ]
+        if errors or data.get("data") is None:
+            raise GraphQLError(errors or data.get("errors") or [])
+        return data["data"]
+
+
+class FileState(namedtuple("FileState", ["path", "sha", "text"])):
+    """State of a file in a repository.
+
+    Only the blob SHA is prefetched, ``text`` is ``None`` unless the content
+    was fetched too.
+    """
+
+    @property
+    def decoded(self):
+        """File content (same as ``github3`` contents objects)."""
+        return (self.text or "").encode("utf8")
+
+
+class RepositoryState(object):
+    """State of a repository as read with GraphQL.
+
+    Attributes are named like the ones of ``github3`` repository objects so
+    the state can be compared with the configuration in the same way.
+    """
+
+    def __init__(self, node, files=()):
+        """Initialize state from a repository GraphQL node."""
+        self.name = node["name"]
+        self.description = node["description"]
+        self.homepage = node["homepageUrl"]
+        self.has_issues = node["hasIssuesEnabled"]
+        self.has_wiki = node["hasWikiEnabled"]
+        self.allow_merge_commit = node["mergeCommitAllowed"]
+        self.allow_rebase_merge = node["rebaseMergeAllowed"]
+        self.allow_squash_merge = node["squashMergeAllowed"]
+        self.updated_at = node["updatedAt"]
+        self.pushed_at = node["pushedAt"]
+        self.default_branch = (node["defaultBranchRef"] or {}).get("name")
+        self.files = {}
+        for i, path in enumerate(files):
+            blob = node.get("f{}".format(i))
+            self.files[path] = (
+                FileState(path, blob["oid"], blob.get("text")) if blob else None
+            )
+        self.branch_protection = {
+            rule["pattern"]: rule for rule in node["branchProtectionRules"]["nodes"]
+        }
+
+
+REPOSITORY_FIELDS = """
+name
+description
+homepageUrl
+hasIssuesEnabled
+hasWikiEnabled
+mergeCommitAllowed
+rebaseMergeAllowed
+squashMergeAllowed
+updatedAt
+pushedAt
+defaultBranchRef { name }
+branchProtectionRules(first: 50) {
+  nodes {
+    pattern
+    requiresLinearHistory
+    isAdminEnforced
+    requiresApprovingReviews
+    requiresStatusChecks
+    restrictsPushes
+    pushAllowances(first: 100) {
+      nodes { actor { ... on Team { slug } ... on User { login } } }
+    }
+  }
+}
+"""
+
+FILE_FIELDS = """
+f{index}: object(expression: {expression}) {{ ... on Blob {{ oid }} }}
+"""
+
+TEAM_CONNECTIONS = {
+    "members": """
+members(first: 100{after}) {{
+  pageInfo {{ hasNextPage endCursor }}
+  nodes {{ login }}
+}}""",
+    "invitations": """
+invitations(first: 100{after}) {{
+  pageInfo {{ hasNextPage endCursor }}
+  nodes {{ invitee {{ login }} }}
+}}""",
+    "repositories": """
+repositories(first: 100{after}) {{
+  pageInfo {{ hasNextPage endCursor }}
+  edges {{ permission node {{ name }} }}
+}}""",
+}
+"""Paginated connections of a team, fetched with the team's first page."""
+
+TEAMS_QUERY = """
+query($org: String!, $cursor: String) {{
+  organization(login: $org) {{
+    teams(first: 100, after: $cursor) {{
+      pageInfo {{ hasNextPage endCursor }}
+      nodes {{
+        name
+        slug{connections}
+      }}
+    }}
+  }}
+}}
+"""
+
+TEAM_QUERY = """
+query($org: String!, $slug: String!, $cursor: String) {{
+  organization(login: $org) {{
+    team(slug: $slug) {{{connection}
+    }}
+  }}
+}}
+"""
+
+
+def _connection_items(name, connection):
+    """Extract the items of a page of a team connection."""
+    if name == "repositories":
+        return {
+            e["node"]["name"]: PERMISSIONS[e["permission"]] for e in connection["edges"]
+        }
+    if name == "invitations":
+        # Invitations sent by email have no invitee yet.
+        return {n["invitee"]["login"] for n in connection["nodes"] if n["invitee"]}
+    return {n["login"] for n in connection["nodes"]}
+
+
+TeamState = namedtuple(
+    "TeamState", ["name", "slug", "members", "invitations", "repositories"]
+)
+"""State of a team: sets of member and invitee logins, and a dictionary of
+repository names and the team's (REST API) permission on them."""
+
+
+class OrgState(object):
+    """Snapshot of the teams of an organisation."""
+
+    def __init__(self, teams):
+        """Initialize state.
+
+        :param teams: Dictionary mapping team names to :class:`TeamState`.
+        """
+        self.teams = teams
+
+
+class StateFetcher(object):
+    """Batched reads of repository and team state."""
+
+    def __init__(self, client, files=(), batch_size=25):
+        """Initialize fetcher.
+
+        :param client: A :class:`GraphQLClient`.
+        :param files: Paths of files whose blob SHA is fetched from the
+            default branch.
+        :param batch_size: Number of repositories fetched per query.
+        """
+        self.client = client
+        self.files = tuple(files)
+        self.batch_size = batch_size
+
+    def _repositories_query(self, count):
+        fields = REPOSITORY_FIELDS + "".join(
+            FILE_FIELDS.format(index=i, expression=json.dumps("HEAD:" + path))
+            for i, path in enumerate(self.files)
+        )
+        params = ", ".join(
+            "$o{0}: String!, $n{0}: String!".format(i) for i in range(count)
+        )
+        repos = "".join(
+            "r{0}: repository(owner: $o{0}, name: $n{0}) {{ ...state }}\n".format(i)
+            for i in range(count)
+        )
+        return "query({}) {{\n{}}}\nfragment state on Repository {{{}}}".format(
+            params, repos, fields
+        )
+
+    def repositories(self, slugs):
+        """Fetch state of repositories.
+
+        :param slugs: List of ``(owner, name)`` tuples.
+        :returns: Dictionary mapping ``(owner, name)`` to a
+            :class:`RepositoryState` (or ``None`` for missing repositories).
+        """
+        result = {}
+        slugs = list(slugs)
+        for start in range(0, len(slugs), self.batch_size):
+            batch = slugs[start : start + self.batch_size]
+            variables = {}
+            for i, (owner, name) in enumerate(batch):
+                variables["o{}".format(i)] = owner
+                variables["n{}".format(i)] = name
+            data = self.client.query(
+                self._repositories_query(len(batch)),
+                variables,
+                allow_not_found=True,
+            )
+            for i, slug in enumerate(batch):
+                node = data.get("r{}".format(i))
+                result[slug] = RepositoryState(node, self.files) if node else None
+        return result
+
+    def _teams(self, org, connections):
+        """Fetch the teams of an organisation with all pages of connections.
+
+        :returns: Iterator of ``(team node, {connection: items})`` tuples.
+        """
+        query = TEAMS_QUERY.format(
+            connections="".join(
+                TEAM_CONNECTIONS[c].format(after="") for c in connections
+            )
+        )
+        cursor = None
+        while True:
+            data = self.client.query(query, {"org": org, "cursor": cursor})
+            teams = data["organization"]["teams"]
+            for team in teams["nodes"]:
+                yield team, {
+                    name: self._connection(org, team["slug"], name, team[name])
+                    for name in connections
+                }
+            if not teams["pageInfo"]["hasNextPage"]:
+                return
+            cursor = teams["pageInfo"]["endCursor"]
+
+    def _connection(self, org, slug, name, connection):
+        """Get the items of a team connection, fetching its next pages."""
+        items = _connection_items(name, connection)
+        while connection["pageInfo"]["hasNextPage"]:
+            query = TEAM_QUERY.format(
+                connection=TEAM_CONNECTIONS[name].format(after=", after: $cursor")
+            )
+            variables = {
+                "org": org,
+                "slug": slug,
+                "cursor": connection["pageInfo"]["endCursor"],
+            }
+            data = self.client.query(query, variables)
+            connection = data["organization"]["team"][name]
+            items.update(_connection_items(name, connection))
+        return items
+
+    def team_repositories(self, org):
+        """Fetch repository permissions of all teams in an organisation.
+
+        :returns: Dictionary mapping team names to dictionaries of repository
+            names and their (REST API) permission.
+        """
+        return {
+            team["name"]: items["repositories"]
+            for team, items in self._teams(org, ("repositories",))
+        }
+
+    def organization(self, org):
+        """Fetch a snapshot of the teams of an organisation.
+
+        Members, pending invitations and repository permissions of all teams
+        are read with one query per 100 teams, plus one per additional page
+        of a team's connections.
+
+        :returns: An :class:`OrgState`.
+        """
+        return OrgState(
+            {
+                team["name"]: TeamState(team["name"], team["slug"], **items)
+                for team, items in self._teams(org, tuple(TEAM_CONNECTIONS))
+            }
+        )
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""On-disk HTTP cache with conditional request revalidation."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from .transport import WrappingAdapter
+
+VARY_HEADERS = ("Accept", "Authorization")
+"""Request headers which are part of the cache key."""
+
+SKIP_HEADERS = ("Content-Encoding", "Content-Length", "Transfer-Encoding")
+"""Response headers which do not apply to the stored (decoded) body."""
+
+
+def _headers(headers):
+    return {k: v for k, v in headers.items() if k.title() not in SKIP_HEADERS}
+
+
+class HTTPCache(object):
+    """Size-bounded on-disk store of HTTP responses.
+
+    Each response is stored in its own file. Files are touched when read, so
+    the least recently used responses are evicted first once the cache
+    grows beyond ``max_size`` bytes.
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024):
+        """Initialize cache in the given directory."""
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """List entries as ``(mtime, path, size)`` tuples."""
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".cache"):
+                continue
+            filepath = os.path.join(self.path, name)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, filepath, st.st_size))
+        return entries
+
+    @staticmethod
+    def key(request):
+        """Compute the cache key of a request."""
+        h = hashlib.sha256(request.method.encode("utf8"))
+        h.update(request.url.encode("utf8"))
+        for name in VARY_HEADERS:
+            h.update(b"\0" + request.headers.get(name, "").encode("utf8"))
+        return h.hexdigest()
+
+    def _filepath(self, key):
+        return os.path.join(self.path, key + ".cache")
+
+    def get(self, key):
+        """Get a stored response as a ``(meta, body)`` tuple or ``None``."""
+        filepath = self._filepath(key)
+        try:
+            with open(filepath, "rb") as fp:
+                meta = json.loads(fp.readline().decode("utf8"))
+                body = fp.read()
+            os.utime(filepath)
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def set(self, key, meta, body):
+        """Store a response."""
+        data = json.dumps(meta).encode("utf8") + b"\n" + body
+        filepath = self._filepath(key)
+        fd, tmppath = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        with self._lock:
+            try:
+                self._size -= os.stat(filepath).st_size
+            except OSError:
+                pass
+            os.replace(tmppath, filepath)
+            self._size += len(data)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Evict least recently used entries down to 90% of the max size."""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, filepath, size in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(filepath)
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            for _, filepath, _ in self._entries():
+                os.remove(filepath)
+            self._size = 0
+
+
+class CachingAdapter(WrappingAdapter):
+    """Transport adapter revalidating cached GET responses.
+
+    Responses carrying an ``ETag`` or ``Last-Modified`` header are stored in
+    an :class:`HTTPCache`. Subsequent requests are sent with
+    ``If-None-Match``/``If-Modified-Since`` and a ``304 Not Modified`` answer
+    is replaced by the stored response.
+
+    With a ``ttl``, all successful responses are stored and served without
+    any request for ``ttl`` seconds after they were last fetched or
+    revalidated. In ``offline`` mode, stored responses are always served and
+    other requests fail with ``504 Gateway Timeout``.
+    """
+
+    def __init__(self, cache, adapter=None, ttl=None, offline=False):
+        """Initialize adapter."""
+        super(CachingAdapter, self).__init__(adapter)
+        self.cache = cache
+        self.ttl = ttl
+        self.offline = offline
+
+    def _fresh(self, meta):
+        if self.offline:
+            return True
+        if not self.ttl or "stored" not in meta:
+            return False
+        return 0 <= time.time() - meta["stored"] < self.ttl
+
+    def send(self, request, **kwargs):
+        """Send a request, using the cache if possible."""
+        if request.method != "GET" or kwargs.get("stream"):
+            return super(CachingAdapter, self).send(request, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            meta = entry[0]
+            if self._fresh(meta):
+                return self._cached_response(request, meta, entry[1])
+            if meta.get("etag"):
+                request.headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request.headers["If-Modified-Since"] = meta["last_modified"]
+        elif self.offline:
+            return self._offline_response(request)
+
+        response = super(CachingAdapter, self).send(request, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            meta, body = entry
+            if self.ttl:
+                meta = dict(meta, stored=time.time())
+                self.cache.set(key, meta, body)
+            return self._cached_response(request, meta, body, response)
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified or self.ttl:
+                meta = {
+                    "url": response.url,
+                    "headers": _headers(response.headers),
+                    "encoding": response.encoding,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "stored": time.time(),
+                }
+                self.cache.set(key, meta, response.content)
+        return response
+
+    @staticmethod
+    def _cached_response(request, meta, body, not_modified=None):
+        """Build a response from a stored entry."""
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response.url = meta["url"]
+        response.request = request
+        response.elapsed = timedelta(0)
+        response._content = body
+        response._content_consumed = True
+        response.from_cache = True
+        if not_modified is not None:
+            # Keep fresh headers from the server (e.g. rate limits).
+            response.headers.update(_headers(not_modified.headers))
+            response.elapsed = not_modified.elapsed
+            not_modified.close()
+        return response
+
+    @staticmethod
+    def _offline_response(request):
+        """Build the response to an uncached request in offline mode."""
+        response = Response()
+        response.status_code = 504
+        response.reason = "Gateway Timeout"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(0)
+        response._content = b""
+        response._content_consumed = True
+        return response
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Concurrent pagination of GitHub REST API listings."""
+
+from urllib.parse import parse_qs, urlsplit
+
+from .pool import run_tasks
+
+PER_PAGE = 100
+"""Maximum page size of the GitHub REST API."""
+
+
+def last_page(response):
+    """Get the number of the last page from the ``Link`` header of a page."""
+    last = response.links.get("last")
+    if last is None:
+        return 1
+    pages = parse_qs(urlsplit(last["url"]).query).get("page")
+    return int(pages[0]) if pages else 1
+
+
+def paginate(core, url, cls, params=None, headers=None, jobs=8):
+    """Iterate over all items of a listing, fetching pages concurrently.
+
+    The first page is requested with the maximum page size, then the next
+    pages up to the ``last`` one of its ``Link`` header are fetched by up to
+    ``jobs`` workers. Items are yielded in the order of the listing.
+
+    :param core: A ``github3`` object whose session is used.
+    :param cls: ``github3`` class the items are wrapped in.
+    """
+    params = dict(params or {}, per_page=PER_PAGE)
+
+    def get(page):
+        response = core._get(url, params=dict(params, page=page), headers=headers)
+        return response, core._json(response, 200) or []
+
+    response, items = get(1)
+    for item in items:
+        yield cls(item, core)
+    pages = range(2, last_page(response) + 1)
+    for res in run_tasks(lambda page: get(page)[1], pages, jobs=jobs):
+        if res.error is not None:
+            raise res.error
+        for item in res.value:
+            yield cls(item, core)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Change sets computed from the difference between desired and actual state."""
+
+import json
+from collections import namedtuple
+
+OPERATIONS = (
+    "delete_team",
+    "create_team",
+    "invite_member",
+    "revoke_member",
+    "add_team_repository",
+    "remove_team_repository",
+    "edit_repository",
+    "protect_branch",
+    "write_file",
+)
+"""Supported operations in the order they are applied."""
+
+TEAM_LIFECYCLE_OPERATIONS = ("delete_team", "create_team")
+
+PLAN_VERSION = 1
+
+
+class Change(namedtuple("Change", ["op", "org", "team", "repository", "params"])):
+    """A single mutation of an organisation team or a repository."""
+
+    __slots__ = ()
+
+    def __new__(cls, op, org, team=None, repository=None, params=None):
+        """Create a new change."""
+        if op not in OPERATIONS:
+            raise ValueError("Unknown operation {}".format(op))
+        return super(Change, cls).__new__(
+            cls, op, org, team, repository, dict(params or {})
+        )
+
+    @property
+    def target(self):
+        """Human readable target of the change."""
+        if self.repository:
+            return "{}/{}".format(self.org, self.repository)
+        return "{} team {}".format(self.org, self.team)
+
+    def __str__(self):
+        """Human readable description of the change."""
+        details = ", ".join(
+            "{}={}".format(k, v)
+            for k, v in sorted(self.params.items())
+            if k not in ("content",)
+        )
+        description = "{}: {}".format(self.target, self.op.replace("_", " "))
+        return "{} ({})".format(description, details) if details else description
+
+    def to_dict(self):
+        """Serialize change."""
+        return {k: v for k, v in self._asdict().items() if v is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Deserialize change."""
+        return cls(**data)
+
+
+def sort_changes(changes):
+    """Sort changes in the order they must be applied (stable)."""
+    return sorted(changes, key=lambda c: OPERATIONS.index(c.op))
+
+
+def dump_plan(changes, fp):
+    """Write a plan as JSON."""
+    json.dump(
+        {"version": PLAN_VERSION, "changes": [c.to_dict() for c in changes]},
+        fp,
+        indent=2,
+        sort_keys=True,
+    )
+    fp.write("\n")
+
+
+def load_plan(fp):
+    """Read a plan written by :func:`dump_plan`."""
+    data = json.load(fp)
+    if data.get("version") != PLAN_VERSION:
+        raise ValueError("Unsupported plan version {}".format(data.get("version")))
+    return [Change.from_dict(c) for c in data["changes"]]
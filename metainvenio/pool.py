@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Bounded worker pool for running API calls concurrently."""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .tracing import complete
+
+TaskResult = namedtuple("TaskResult", ["item", "value", "error"])
+"""Outcome of running a task on a single item."""
+
+
+def _call(func, item, submitted=None):
+    """Run a task and capture its outcome."""
+    if submitted is not None:
+        # Time spent waiting for a free worker.
+        complete("queued", submitted, time.perf_counter(), "pool")
+    try:
+        return TaskResult(item, func(item), None)
+    except Exception as e:
+        return TaskResult(item, None, e)
+
+
+def run_tasks(func, items, jobs=1):
+    """Run ``func`` for each item using at most ``jobs`` worker threads.
+
+    Results are yielded in the same order as ``items``. Exceptions raised by
+    ``func`` are captured in the result instead of aborting the whole run.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield _call(func, item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = [
+        executor.submit(_call, func, item, time.perf_counter()) for item in items
+    ]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
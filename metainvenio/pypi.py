@@ -25,23 +25,60 @@
 """PyPI API."""
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .pool import run_tasks
+
+PYPI_URL = "https://pypi.org"
 
 
 class PyPIAPI(object):
-    """Python Package Index API client."""
+    """Python Package Index API client.
+
+    Connections are kept alive and pooled, so packages can be fetched
+    concurrently with :meth:`latest_releases`.
+    """
 
-    def __init__(self):
-        """Initialize API class."""
+    def __init__(self, url=PYPI_URL, pool_size=10, timeout=30, max_retries=3):
+        """Initialize API class.
+
+        :param url: Base URL of the package index.
+        :param pool_size: Maximum number of connections kept open.
+        :param timeout: Timeout of requests in seconds.
+        :param max_retries: Number of retries of failed requests.
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
         self.client = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+            ),
+        )
+        self.client.mount("https://", adapter)
+        self.client.mount("http://", adapter)
 
     def latest_release(self, package_name):
         """Get information about latest release for a given package."""
-        endpoint = "https://pypi.org/pypi/{}/json".format(package_name)
-        res = self.client.get(endpoint)
+        endpoint = "{}/pypi/{}/json".format(self.url, package_name)
+        res = self.client.get(endpoint, timeout=self.timeout)
         if res.status_code == 200:
             return res.json()
         return None
 
+    def latest_releases(self, package_names, jobs=10):
+        """Get information about the latest release of several packages.
+
+        :returns: Iterator of :class:`~metainvenio.pool.TaskResult` in the
+            same order as ``package_names``.
+        """
+        return run_tasks(self.latest_release, package_names, jobs=jobs)
+
     @staticmethod
     def development_status(classifiers):
         """Find development status classifier."""
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Rate limit aware scheduling of GitHub API requests."""
+
+import json
+import logging
+import random
+import threading
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from requests.exceptions import ConnectionError, Timeout
+
+from .tracing import complete
+from .transport import WrappingAdapter
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+WRITE_METHODS = ("POST", "PATCH", "PUT", "DELETE")
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+logger = logging.getLogger(__name__)
+
+
+def request_resource(url):
+    """Get the GitHub rate limit resource a request URL counts against."""
+    path = urlsplit(url).path
+    if path.endswith("/graphql"):
+        return "graphql"
+    if path.startswith("/search/"):
+        return "search"
+    return "core"
+
+
+def is_write(method, resource="core", body=None):
+    """Check if a request writes, and so has to be spaced from other writes.
+
+    GraphQL requests are all ``POST`` requests, but only mutations write.
+    """
+    if resource == "graphql":
+        try:
+            query = json.loads(body)["query"]
+        except (TypeError, ValueError, KeyError):
+            return True
+        return query.lstrip().startswith("mutation")
+    return method in WRITE_METHODS
+
+
+def parse_retry_after(value):
+    """Parse a ``Retry-After`` header into seconds, or ``None`` if invalid.
+
+    The header holds either a number of seconds or an HTTP date.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp() - time.time()
+
+
+class RateLimiter(object):
+    """Schedule requests of all worker threads within GitHub rate limits.
+
+    The limiter tracks the primary rate limit (``X-RateLimit-Remaining`` and
+    ``X-RateLimit-Reset``) of each resource (``X-RateLimit-Resource``, e.g.
+    ``core`` or ``graphql``) and pauses the requests to a resource until its
+    reset once the remaining quota drops to ``reserve``. Secondary rate
+    limits (``403``/``429`` responses, usually with a ``Retry-After`` header)
+    pause all requests and halve the number of concurrent requests, which
+    then grows back by one per successful round of requests up to
+    ``max_concurrency``. Write requests (see :func:`is_write`) are spaced by
+    at least ``write_interval`` seconds as recommended by GitHub.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=10,
+        min_concurrency=1,
+        reserve=10,
+        write_interval=1.0,
+        max_backoff=60.0,
+    ):
+        """Initialize limiter."""
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.reserve = reserve
+        self.write_interval = write_interval
+        self.max_backoff = max_backoff
+        self.concurrency = float(max_concurrency)
+        self.limits = {}
+        self._active = 0
+        self._paused_until = 0.0
+        self._resource_paused_until = {}
+        self._next_write = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, method="GET", resource="core", write=None):
+        """Wait until a request to a rate limit resource can be sent.
+
+        :param write: Whether the request writes, defaults to whether
+            ``method`` is a write method.
+        """
+        if write is None:
+            write = method in WRITE_METHODS
+        with self._cond:
+            while True:
+                now = time.time()
+                paused_until = max(
+                    self._paused_until, self._resource_paused_until.get(resource, 0.0)
+                )
+                wait = paused_until - now
+                if write:
+                    wait = max(wait, self._next_write - now)
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self._active >= int(self.concurrency):
+                    self._cond.wait()
+                else:
+                    break
+            self._active += 1
+            if write:
+                self._next_write = now + self.write_interval
+
+    def release(self, response=None, resource="core"):
+        """Release a request slot and update limits from the response.
+
+        :returns: Number of seconds after which the request should be
+            retried because of a rate limit, or ``None``.
+        """
+        with self._cond:
+            self._active -= 1
+            try:
+                if response is not None:
+                    return self._update(response, resource)
+                return None
+            finally:
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Pause all requests."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Get a jittered exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.max_backoff, 2**attempt))
+
+    def _pause_resource(self, resource, until):
+        self._resource_paused_until[resource] = max(
+            self._resource_paused_until.get(resource, 0.0), until
+        )
+
+    def _update(self, response, resource="core"):
+        headers = response.headers
+        now = time.time()
+        resource = headers.get("X-RateLimit-Resource", resource)
+        limit = self.limits.setdefault(resource, {"remaining": None, "reset": None})
+        if "X-RateLimit-Remaining" in headers:
+            try:
+                limit["remaining"] = int(headers["X-RateLimit-Remaining"])
+                limit["reset"] = int(headers["X-RateLimit-Reset"])
+            except (KeyError, ValueError):
+                pass
+        remaining, reset = limit["remaining"], limit["reset"]
+
+        limited = response.status_code == 429 or (
+            response.status_code == 403
+            and (
+                "Retry-After" in headers
+                or remaining == 0
+                or b"rate limit" in (response.content or b"").lower()
+            )
+        )
+        if limited:
+            delay = None
+            if "Retry-After" in headers:
+                delay = parse_retry_after(headers["Retry-After"])
+            if delay is None:
+                if remaining == 0 and reset:
+                    delay = reset - now + 1
+                else:
+                    # Secondary limit without a hint: wait at least a minute.
+                    delay = 60.0
+            delay = max(delay, 0.0)
+            if remaining == 0:
+                # Primary limit: only the exhausted resource has to wait.
+                self._pause_resource(resource, now + delay)
+            else:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                self._paused_until = max(self._paused_until, now + delay)
+            logger.warning(
+                "Rate limit hit, pausing %s requests for %.0f seconds "
+                "(concurrency %d)",
+                resource if remaining == 0 else "all",
+                delay,
+                self.concurrency,
+            )
+            return delay
+
+        if remaining is not None and remaining <= self.reserve:
+            if reset and reset > now:
+                logger.warning(
+                    "Rate limit almost exhausted, pausing %s requests for %.0f seconds",
+                    resource,
+                    reset - now,
+                )
+                self._pause_resource(resource, reset + 1)
+        elif self.concurrency < self.max_concurrency:
+            # Additive increase: one more slot per round of requests.
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1.0 / self.concurrency
+            )
+        return None
+
+
+class RateLimitAdapter(WrappingAdapter):
+    """Transport adapter sending requests through a :class:`RateLimiter`.
+
+    Rate limited requests are retried once the limit allows it. Idempotent
+    requests are also retried on server and connection errors with a
+    jittered exponential backoff.
+    """
+
+    def __init__(self, limiter, adapter=None, max_retries=5):
+        """Initialize adapter."""
+        super(RateLimitAdapter, self).__init__(adapter)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def send(self, request, **kwargs):
+        """Send a request within the rate limits."""
+        idempotent = request.method in IDEMPOTENT_METHODS
+        resource = request_resource(request.url)
+        write = is_write(request.method, resource, request.body)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            self.limiter.acquire(request.method, resource, write)
+            end = time.perf_counter()
+            if end - start > 0.001:
+                complete("rate limit wait", start, end, "ratelimit")
+            try:
+                response = super(RateLimitAdapter, self).send(request, **kwargs)
+            except (ConnectionError, Timeout):
+                self.limiter.release(resource=resource)
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self.limiter.backoff(attempt)
+            else:
+                delay = self.limiter.release(response, resource)
+                if delay is None:
+                    if not idempotent or response.status_code not in RETRY_STATUS_CODES:
+                        return response
+                    delay = self.limiter.backoff(attempt)
+                if attempt >= self.max_retries:
+                    return response
+                response.close()
+            attempt += 1
+            logger.info(
+                "Retrying %s %s in %.1f seconds", request.method, request.url, delay
+            )
+            time.sleep(delay)
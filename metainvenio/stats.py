@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Statistics of HTTP requests."""
+
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from .tracing import span
+from .transport import WrappingAdapter
+
+ENDPOINTS = (
+    "/graphql",
+    "/orgs/{org}",
+    "/orgs/{org}/{collection}",
+    "/teams/{id}",
+    "/teams/{id}/{collection}",
+    "/teams/{id}/memberships/{user}",
+    "/teams/{id}/repos/{owner}/{repo}",
+    "/repos/{owner}/{repo}",
+    "/repos/{owner}/{repo}/branches/{branch}",
+    "/repos/{owner}/{repo}/branches/{branch}/protection",
+    "/repos/{owner}/{repo}/contents/{+path}",
+    "/repos/{owner}/{repo}/git/{collection}",
+    "/repos/{owner}/{repo}/git/ref/{+ref}",
+    "/repos/{owner}/{repo}/git/refs/{+ref}",
+    "/repos/{owner}/{repo}/git/{collection}/{sha}",
+    "/pypi/{package}/json",
+    "/pypi/{package}/{version}/json",
+    "/simple/{package}/",
+)
+"""Templates of the API endpoints, in order of precedence."""
+
+BUCKETS = [0.001 * 1.25**i for i in range(64)]
+"""Upper bounds (in seconds) of the latency histogram buckets."""
+
+
+def _compile(template):
+    def replace(match):
+        name = match.group(1)
+        if name == "collection":
+            return "[a-z_]+"
+        return ".+" if name.startswith("+") else "[^/]+"
+
+    return re.compile(re.sub(r"\{([^}]+)\}", replace, template) + "$")
+
+
+_ENDPOINTS = [(_compile(t), t) for t in ENDPOINTS]
+
+
+def endpoint_template(url):
+    """Get the endpoint template of a URL (e.g. ``/repos/{owner}/{repo}``)."""
+    path = urlsplit(url).path
+    if path.startswith("/api/v3/"):
+        path = path[len("/api/v3") :]
+    elif path == "/api/graphql":
+        path = "/graphql"
+    for regex, template in _ENDPOINTS:
+        if regex.match(path):
+            if "{collection}" in template:
+                parts = template.split("/")
+                i = parts.index("{collection}")
+                parts[i] = path.split("/")[i]
+                return "/".join(parts)
+            return template
+    return path
+
+
+class Histogram(object):
+    """Latency histogram with exponentially growing buckets."""
+
+    def __init__(self):
+        """Initialize histogram."""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, value):
+        """Add a value."""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """Estimate a percentile (the upper bound of its bucket)."""
+        if not self.total:
+            return None
+        rank = p / 100.0 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class EndpointStats(object):
+    """Statistics of the requests to an endpoint."""
+
+    def __init__(self):
+        """Initialize statistics."""
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        """Serialize statistics."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "not_modified": self.not_modified,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency": {
+                "p50": self.latency.percentile(50),
+                "p90": self.latency.percentile(90),
+                "p99": self.latency.percentile(99),
+                "max": self.latency.max,
+            },
+        }
+
+
+class RequestStats(object):
+    """Thread-safe collector of request statistics per endpoint."""
+
+    def __init__(self):
+        """Initialize collector."""
+        self.endpoints = {}
+        self.rate_limits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, request, response=None, elapsed=0.0, retry=False, received=0):
+        """Record a request and its response (``None`` on connection errors).
+
+        :param received: Number of bytes received.
+        """
+        key = "{} {}".format(request.method, endpoint_template(request.url))
+        body = request.body or b""
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.calls += 1
+            stats.retries += retry
+            stats.bytes_sent += len(body)
+            stats.bytes_received += received
+            stats.latency.add(elapsed)
+            if response is None:
+                stats.errors += 1
+                return
+            if response.status_code == 304:
+                stats.not_modified += 1
+            elif response.status_code >= 400:
+                stats.errors += 1
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            if remaining is not None and remaining.isdigit():
+                resource = response.headers.get("X-RateLimit-Resource", "core")
+                limit = self.rate_limits.setdefault(
+                    resource, {"remaining": None, "used": 0}
+                )
+                limit["remaining"] = int(remaining)
+                if response.status_code != 304:
+                    # Conditional requests answered with 304 are free.
+                    limit["used"] += 1
+
+    def to_dict(self):
+        """Serialize statistics."""
+        with self._lock:
+            return {
+                "endpoints": OrderedDict(
+                    (k, self.endpoints[k].to_dict()) for k in sorted(self.endpoints)
+                ),
+                "rate_limits": OrderedDict(
+                    (k, dict(v)) for k, v in self.rate_limits.items()
+                ),
+            }
+
+    def format_table(self):
+        """Format statistics as a text table."""
+
+        def ms(value):
+            return "-" if value is None else "{:.0f}".format(value * 1000)
+
+        data = self.to_dict()
+        rows = [
+            (
+                "endpoint",
+                "calls",
+                "errors",
+                "retries",
+                "304",
+                "kB",
+                "p50 ms",
+                "p90 ms",
+                "p99 ms",
+            )
+        ]
+        for name, s in data["endpoints"].items():
+            rows.append(
+                (
+                    name,
+                    str(s["calls"]),
+                    str(s["errors"]),
+                    str(s["retries"]),
+                    str(s["not_modified"]),
+                    "{:.1f}".format((s["bytes_sent"] + s["bytes_received"]) / 1024.0),
+                    ms(s["latency"]["p50"]),
+                    ms(s["latency"]["p90"]),
+                    ms(s["latency"]["p99"]),
+                )
+            )
+        width = max(len(r[0]) for r in rows)
+        lines = [
+            "  ".join([r[0].ljust(width)] + [c.rjust(7) for c in r[1:]]) for r in rows
+        ]
+        for resource, limit in data["rate_limits"].items():
+            lines.append(
+                "Rate limit ({}): {} used, {} remaining".format(
+                    resource, limit["used"], limit["remaining"]
+                )
+            )
+        return "\n".join(lines)
+
+
+class StatsAdapter(WrappingAdapter):
+    """Transport adapter recording statistics of the requests sent.
+
+    Mounted as the innermost adapter, it sees every request sent over the
+    network, including retries and conditional requests.
+    """
+
+    def __init__(self, stats, adapter=None):
+        """Initialize adapter."""
+        super(StatsAdapter, self).__init__(adapter)
+        self.stats = stats
+        self._sent = weakref.WeakSet()
+
+    def send(self, request, **kwargs):
+        """Send a request and record it."""
+        retry = request in self._sent
+        self._sent.add(request)
+        start = time.perf_counter()
+        try:
+            response = super(StatsAdapter, self).send(request, **kwargs)
+            if kwargs.get("stream"):
+                length = response.headers.get("Content-Length", "")
+                received = int(length) if length.isdigit() else 0
+            else:
+                # Include the download of the body in the latency.
+                received = len(response.content or b"")
+        except Exception:
+            self.stats.record(request, None, time.perf_counter() - start, retry)
+            raise
+        self.stats.record(
+            request, response, time.perf_counter() - start, retry, received
+        )
+        return response
+
+
+class TracingAdapter(WrappingAdapter):
+    """Transport adapter recording a trace span for each request sent."""
+
+    def send(self, request, **kwargs):
+        """Send a request within a span."""
+        name = "{} {}".format(request.method, endpoint_template(request.url))
+        with span(name, "http", url=request.url) as args:
+            response = super(TracingAdapter, self).send(request, **kwargs)
+            args["status"] = response.status_code
+            return response
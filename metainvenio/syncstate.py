@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""State of the last successful synchronisation of repositories."""
+
+import hashlib
+import json
+import os
+import tempfile
+
+STATE_VERSION = 1
+
+
+def fingerprint(data):
+    """Hash JSON serializable data independently of the key order."""
+    dumped = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(dumped.encode("utf8")).hexdigest()
+
+
+def config_fingerprint(repo, **options):
+    """Fingerprint the effective configuration of a repository.
+
+    The organisation is left out (it contains the configuration of all other
+    repositories), while the command options are included since they
+    determine what is synchronised.
+    """
+    conf = {k: v for k, v in repo.items() if k != "org"}
+    return fingerprint({"repository": conf, "options": options})
+
+
+class SyncState(object):
+    """Per repository fingerprints recorded at the last successful sync.
+
+    A repository only needs to be synchronised again when either its
+    configuration or its remote state changed since then.
+    """
+
+    def __init__(self, path):
+        """Load the state from the given file (if it exists)."""
+        self.path = path
+        self.repositories = {}
+        try:
+            with open(path, "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == STATE_VERSION:
+            self.repositories = data.get("repositories", {})
+
+    def unchanged(self, slug, config, remote):
+        """Determine if a repository is unchanged since the last sync."""
+        if remote is None:
+            return False
+        return self.repositories.get(slug) == {"config": config, "remote": remote}
+
+    def record(self, slug, config, remote):
+        """Record a successful sync of a repository."""
+        if remote is None:
+            self.forget(slug)
+        else:
+            self.repositories[slug] = {"config": config, "remote": remote}
+
+    def forget(self, slug):
+        """Forget a repository so it is synchronised on the next run."""
+        self.repositories.pop(slug, None)
+
+    def save(self):
+        """Write the state atomically."""
+        dirpath = os.path.dirname(self.path) or "."
+        os.makedirs(dirpath, exist_ok=True)
+        fd, tmppath = tempfile.mkstemp(dir=dirpath, suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump(
+                {"version": STATE_VERSION, "repositories": self.repositories},
+                fp,
+                sort_keys=True,
+            )
+        os.replace(tmppath, self.path)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Tracing of operations and profiling.
+
+Spans are recorded as complete events of the Chrome trace event format,
+so traces can be loaded in ``chrome://tracing`` or https://ui.perfetto.dev.
+Tracing is disabled unless a tracer is installed with :func:`set_tracer`.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_tracer = None
+
+
+class Tracer(object):
+    """Collector of trace events."""
+
+    def __init__(self):
+        """Initialize tracer."""
+        self.events = []
+        self.threads = {}
+        self._start = time.perf_counter()
+        self._pid = os.getpid()
+
+    def complete(self, name, start, end, cat="", args=None):
+        """Record a span from ``start`` to ``end`` (``time.perf_counter()``)."""
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start - self._start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self._pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        # list.append is atomic, no lock needed.
+        self.events.append(event)
+
+    @contextmanager
+    def span(self, name, cat="", **args):
+        """Record a span around a block.
+
+        The block can add arguments to the span through the yielded
+        dictionary.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        except Exception as e:
+            args["error"] = str(e)
+            raise
+        finally:
+            self.complete(name, start, time.perf_counter(), cat, args)
+
+    def to_dict(self):
+        """Get the trace in the Chrome trace event format."""
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in self.threads.items()
+        ]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+
+    def dump(self, fp):
+        """Write the trace as JSON."""
+        json.dump(self.to_dict(), fp)
+
+
+def set_tracer(tracer):
+    """Install a tracer (or ``None`` to disable tracing)."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    """Get the installed tracer (``None`` if tracing is disabled)."""
+    return _tracer
+
+
+def span(name, cat="", **args):
+    """Record a span with the installed tracer (if any)."""
+    if _tracer is None:
+        return nullcontext(args)
+    return _tracer.span(name, cat, **args)
+
+
+def complete(name, start, end, cat="", args=None):
+    """Record a span which already ended with the installed tracer (if any)."""
+    if _tracer is not None:
+        _tracer.complete(name, start, end, cat, args)
+
+
+def traced(name, cat="operation"):
+    """Decorate a function to record a span for each call."""
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name, cat):
+                return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Profiler(object):
+    """CPU profiler of the main thread and of threads started while running.
+
+    Each thread gets its own :class:`cProfile.Profile` and the results are
+    merged when dumped. Python 3.12+ only allows one active profiler, so
+    only the main thread is profiled there.
+    """
+
+    def __init__(self):
+        """Initialize profiler."""
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def _new_profile(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active.
+            return None
+        with self._lock:
+            self.profiles.append(profile)
+        return profile
+
+    def _start_thread(self, *args):
+        # Called as profile function of new threads: replace it by cProfile.
+        self._new_profile()
+
+    def start(self):
+        """Start profiling."""
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start_thread)
+        self._main = self._new_profile()
+
+    def stop(self):
+        """Stop profiling."""
+        threading.setprofile(None)
+        if self._main is not None:
+            self._main.disable()
+
+    def dump(self, path):
+        """Write the merged profiling statistics (``pstats`` format)."""
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats()
+        for profile in profiles:
+            stats.add(profile)
+        stats.dump_stats(path)
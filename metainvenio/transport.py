@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""HTTP transport adapters."""
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+
+class WrappingAdapter(BaseAdapter):
+    """Transport adapter which delegates to another adapter.
+
+    Subclasses override :meth:`send` to add behaviour around the requests
+    sent by the wrapped adapter, so that several of them can be stacked.
+    """
+
+    def __init__(self, adapter=None):
+        """Initialize adapter."""
+        super(WrappingAdapter, self).__init__()
+        self.adapter = HTTPAdapter() if adapter is None else adapter
+
+    def send(self, request, **kwargs):
+        """Send a request with the wrapped adapter."""
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        """Close the wrapped adapter."""
+        self.adapter.close()
+
+
+def wrap_adapters(session, factory):
+    """Wrap the HTTP and HTTPS adapters of a session.
+
+    :param factory: Callable returning a new adapter wrapping the adapter
+        it's called with.
+    """
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, factory(session.get_adapter(prefix)))
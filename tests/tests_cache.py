@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test resource cache module."""
+
+from metainvenio.cache import ResourceCache
+
+
+def test_resource_cache():
+    """Test resources are fetched once until invalidated."""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return len(calls)
+
+    cache = ResourceCache()
+    repo = ("repo", "myorg", "testrepo")
+    branch = repo + ("branch", "master")
+    assert cache.get(repo, fetch) == 1
+    assert cache.get(repo, fetch) == 1
+    assert cache.get(branch, fetch) == 2
+
+    # Invalidating the repository also invalidates its branches.
+    cache.invalidate(*repo)
+    assert cache.get(branch, fetch) == 3
+    assert cache.get(repo, fetch) == 4
+    cache.invalidate(*branch)
+    assert cache.get(repo, fetch) == 4
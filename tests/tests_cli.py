@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test command line interface."""
+
+import json
+import subprocess
+import sys
+from os.path import dirname, join
+
+HEAVY_MODULES = ("github3", "requests", "metainvenio.github", "metainvenio.pypi")
+
+IMPORT_CHECK = """
+import json, sys
+from click.testing import CliRunner
+from metainvenio.cli import cli
+result = CliRunner().invoke(cli, sys.argv[1:])
+print(json.dumps({
+    "exit_code": result.exit_code,
+    "modules": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def _imported(*args):
+    """Run the CLI in a new interpreter and list the heavy modules imported."""
+    out = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_CHECK % (HEAVY_MODULES,)] + list(args)
+    )
+    return json.loads(out.decode("utf8").splitlines()[-1])
+
+
+def test_lazy_subcommands(tmp_path):
+    """Test the GitHub and HTTP clients are only imported when needed."""
+    conf = join(dirname(__file__), "repositories.yml")
+    common = ["-c", conf, "--cache-dir", str(tmp_path)]
+
+    res = _imported(*common + ["conf", "repo-overview"])
+    assert res == {"exit_code": 0, "modules": []}
+
+    res = _imported(*common + ["github", "--help"])
+    assert res["exit_code"] == 0
+    assert "github3" in res["modules"]
+    assert "metainvenio.pypi" not in res["modules"]
@@ -24,6 +24,11 @@
 
 """Test configuration module."""
 
+import os
+import pickle
+
+import pytest
+
 from metainvenio.config import ConfigParser
 
 
@@ -75,3 +80,74 @@ def test_single_repo_teams(confrepo):
     assert [(t.name, len(t.members)) for t in teams] == [
         ("testrepo-maintainers", 2),
     ]
+
+
+def test_lookups(conf):
+    """Test indexed lookups."""
+    assert conf.organisation("myorg").name == "myorg"
+    assert conf.repository("myorg/testrepo").state == "stable"
+    assert conf.repository("myorg/missing") is None
+    assert [r.name for r in conf.org_repositories("myorg")] == [
+        "testrepo",
+        "anotherrepo",
+    ]
+    assert len(conf.type_repositories("independent")) == 2
+    assert [r.name for r in conf.maintainer_repositories("usera")] == ["testrepo"]
+    assert conf.maintainers == ["usera", "userb"]
+    assert [t.name for t in conf.org_teams("myorg")] == [t.name for t in conf.teams]
+    team = conf.team("myorg", "testrepo-maintainers")
+    assert team.org.name == "myorg"
+    assert list(team.members) == ["usera", "userb"]
+
+
+def test_data_unchanged(conf):
+    """Test resolving the configuration does not modify the parsed data."""
+    repo = conf.data["orgs"]["myorg"]["repositories"]["testrepo"]
+    assert "slug" not in repo
+    assert "org" not in repo
+
+
+def test_records(conf):
+    """Test configuration records."""
+    org = conf.organisation("myorg")
+    repo = conf.repository("myorg/testrepo")
+    assert repo.org is org
+    assert all(t.org is org for t in conf.teams)
+    assert repo["slug"] == repo.get("slug") == "myorg/testrepo"
+    assert repo.get("missing", "default") == "default"
+    assert repo.maintainers == ("usera", "userb")
+    assert not hasattr(repo, "__dict__")
+    with pytest.raises(AttributeError):
+        repo.name = "other"
+    with pytest.raises(KeyError):
+        repo["missing"]
+    assert pickle.loads(pickle.dumps(repo)).slug == repo.slug
+
+
+def test_cache(ymlfp, tmp_path):
+    """Test caching the resolved configuration."""
+    content = ymlfp.read()
+    cache_dir = str(tmp_path)
+    conf = ConfigParser(content, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    cached = ConfigParser(content, cache_dir=cache_dir)
+    assert cached.data == conf.data
+    assert [r.slug for r in cached.repositories] == [r.slug for r in conf.repositories]
+    assert cached.repository("myorg/testrepo").org is cached.organisation("myorg")
+    assert len(os.listdir(cache_dir)) == 1
+
+    # Selection and content are part of the key.
+    single = ConfigParser(content, repository=["myorg/testrepo"], cache_dir=cache_dir)
+    assert [r.slug for r in single.repositories] == ["myorg/testrepo"]
+    ConfigParser(content + "\n", cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 3
+
+
+def test_cache_corrupt(ymlfp, tmp_path):
+    """Test a corrupt cache entry is ignored."""
+    content = ymlfp.read()
+    conf = ConfigParser(content, cache_dir=str(tmp_path))
+    (path,) = tmp_path.iterdir()
+    path.write_bytes(b"corrupt")
+    assert ConfigParser(content, cache_dir=str(tmp_path)).data == conf.data
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test GitHub module."""
+
+from metainvenio import github
+from metainvenio.cache import ResourceCache
+from metainvenio.config import OrgConfig, RepoConfig, TeamConfig
+from metainvenio.github import (
+    MAINTAINERS_FILE,
+    PULL_REQUEST_TEMPLATE,
+    OrgAPI,
+    RepositoryAPI,
+    apply_changes,
+    git_blob_sha,
+    normalize_protection,
+)
+from metainvenio.graphql import FileState, OrgState, TeamState
+from metainvenio.plan import Change
+
+PAYLOAD = dict(
+    required_status_checks=None,
+    required_pull_request_reviews=None,
+    required_linear_history=True,
+    restrictions=dict(users=[], teams=["My Team"]),
+    dismissal_restrictions=dict(users=[], teams=["My Team"]),
+    enforce_admins=False,
+)
+
+
+def test_normalize_protection_rest():
+    """Test comparing a payload with the REST API branch protection."""
+    current = {
+        "required_linear_history": {"enabled": True},
+        "enforce_admins": {"enabled": False},
+        "restrictions": {"users": [], "teams": [{"slug": "my-team"}]},
+    }
+    assert normalize_protection(current) == normalize_protection(PAYLOAD)
+    current["enforce_admins"]["enabled"] = True
+    assert normalize_protection(current) != normalize_protection(PAYLOAD)
+    assert normalize_protection(None) is None
+
+
+def test_normalize_protection_graphql():
+    """Test comparing a payload with a GraphQL branch protection rule."""
+    rule = {
+        "pattern": "master",
+        "requiresLinearHistory": True,
+        "isAdminEnforced": False,
+        "requiresApprovingReviews": False,
+        "requiresStatusChecks": False,
+        "restrictsPushes": True,
+        "pushAllowances": {"nodes": [{"actor": {"slug": "my-team"}}]},
+    }
+    assert normalize_protection(rule) == normalize_protection(PAYLOAD)
+    rule["pushAllowances"]["nodes"] = []
+    assert normalize_protection(rule) != normalize_protection(PAYLOAD)
+
+
+class _State(object):
+    """Prefetched repository state with only files."""
+
+    def __init__(self, *files):
+        self.files = {f.path: f for f in files}
+
+
+def test_git_blob_sha():
+    """Test computing blob SHAs like git does."""
+    assert git_blob_sha(b"") == "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    assert git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_diff_maintainers_file():
+    """Test the MAINTAINERS file is compared by SHA before its content."""
+    org = OrgConfig(name="org", repositories={})
+    conf = RepoConfig(name="repo", org=org, maintainers=["userb", "usera"])
+    cache = ResourceCache()
+    key = ("repo", "org", "repo", "state")
+    api = RepositoryAPI(None, conf=conf, cache=cache)
+
+    # Same SHA, the content is not needed.
+    sha = git_blob_sha(b"usera\nuserb")
+    cache.set(key, _State(FileState(MAINTAINERS_FILE, sha, None)))
+    assert api.diff_maintainers_file() == []
+
+    # Different SHA, but same maintainers.
+    cache.set(key, _State(FileState(MAINTAINERS_FILE, "1", "userb\nusera\n")))
+    assert api.diff_maintainers_file() == []
+
+    cache.set(key, _State(FileState(MAINTAINERS_FILE, "1", "usera\n")))
+    (change,) = api.diff_maintainers_file()
+    assert change.params["content"] == "usera\nuserb"
+
+
+class _Repository(object):
+    """Repository recording the commits."""
+
+    default_branch = "main"
+
+    def __init__(self):
+        self.commits = []
+
+    def commit_files(self, branch, files, message, parent, base_tree):
+        self.commits.append((branch, files, message, parent, base_tree))
+
+
+class _Branch(object):
+    def as_dict(self):
+        return {"commit": {"sha": "c1", "commit": {"tree": {"sha": "t1"}}}}
+
+
+def _write_file(path, message):
+    return Change(
+        "write_file",
+        "org",
+        repository="repo",
+        params=dict(path=path, content="x", message=message),
+    )
+
+
+def test_apply_write_files():
+    """Test files are written in a single commit."""
+    org = OrgConfig(name="org", repositories={})
+    conf = RepoConfig(name="repo", org=org)
+    changes = [
+        _write_file(MAINTAINERS_FILE, "global: maintainers update"),
+        _write_file(PULL_REQUEST_TEMPLATE, "global: template update"),
+    ]
+
+    for commit_message, expected in (
+        (
+            None,
+            "global: managed files update\n\n"
+            "* global: maintainers update\n* global: template update",
+        ),
+        ("chore: sync", "chore: sync"),
+    ):
+        cache = ResourceCache()
+        repo = _Repository()
+        cache.set(("repo", "org", "repo"), repo)
+        cache.set(("repo", "org", "repo", "branch", "main"), _Branch())
+        api = RepositoryAPI(None, conf=conf, cache=cache, commit_message=commit_message)
+        assert api.apply(changes)
+        assert repo.commits == [
+            (
+                "main",
+                {MAINTAINERS_FILE: "x", PULL_REQUEST_TEMPLATE: "x"},
+                expected,
+                "c1",
+                "t1",
+            )
+        ]
+        # The commit changed the repository.
+        assert cache.lookup(("repo", "org", "repo")) is None
+
+    cache = ResourceCache()
+    cache.set(("repo", "org", "repo"), repo)
+    cache.set(("repo", "org", "repo", "branch", "main"), _Branch())
+    RepositoryAPI(None, conf=conf, cache=cache).apply(changes[:1])
+    assert repo.commits[-1][2] == "global: maintainers update"
+
+
+def test_diff_team_members_pending():
+    """Test users with a pending invitation are not invited again."""
+    api = OrgAPI(None, conf=OrgConfig(name="org", repositories={}))
+    changes = api.diff_team_members(
+        "team", {"usera"}, ["usera", "userb", "userc"], pending={"userb", "userd"}
+    )
+    assert [(c.op, c.params["login"]) for c in changes] == [
+        ("invite_member", "userc"),
+        ("revoke_member", "userd"),
+    ]
+    assert api.diff_team_members("team", {"usera"}, ["usera"], pending={}) == []
+
+
+def test_reinvitations():
+    """Test expired invitations renewed by changes are reported."""
+    cache = ResourceCache()
+    cache.set(("org", "org", "failed-invitations"), {"userc": "expired"})
+    api = OrgAPI(None, conf=OrgConfig(name="org", repositories={}), cache=cache)
+    changes = [
+        Change("invite_member", "org", team="team", params={"login": "userb"}),
+        Change("invite_member", "org", team="team", params={"login": "userc"}),
+        Change("revoke_member", "org", team="team", params={"login": "userd"}),
+    ]
+    assert api.reinvitations(changes) == {"userc": "expired"}
+    assert api.reinvitations(changes[2:]) == {}
+
+
+def test_apply_changes_failed_team(monkeypatch):
+    """Test teams which failed to be created are not populated."""
+    applied = []
+
+    def create_team(self, name, repositories):
+        if name == "a":
+            raise RuntimeError("Validation failed")
+        applied.append(("create_team", name))
+
+    def invite_member(self, name, login):
+        applied.append(("invite_member", name))
+
+    monkeypatch.setattr(OrgAPI, "_apply_create_team", create_team)
+    monkeypatch.setattr(OrgAPI, "_apply_invite_member", invite_member)
+    changes = [
+        Change("create_team", "org", team=t, params={"repositories": []})
+        for t in ("a", "b")
+    ] + [
+        Change("invite_member", "org", team=t, params={"login": "usera"})
+        for t in ("a", "b")
+    ]
+    results = list(apply_changes(None, ResourceCache(), changes, jobs=2))
+    assert [([c.op for c in r.item], r.item[0].team) for r in results] == [
+        (["create_team"], "a"),
+        (["create_team"], "b"),
+        (["invite_member"], "a"),
+        (["invite_member"], "b"),
+    ]
+    assert [str(r.error) if r.error else None for r in results] == [
+        "Validation failed",
+        None,
+        "Team a was not created",
+        None,
+    ]
+    assert applied == [("create_team", "b"), ("invite_member", "b")]
+
+
+class StubTeam(object):
+    """Team of a :class:`StubOrganization`."""
+
+    def __init__(self, name):
+        """Initialize team."""
+        self.name = name
+        self.session = None
+        self.deleted = False
+
+    def as_dict(self):
+        """Get the team's JSON."""
+        return {"name": self.name}
+
+    def delete(self):
+        """Delete the team."""
+        self.deleted = True
+
+
+class StubOrganization(object):
+    """Organisation counting its teams listings."""
+
+    def __init__(self, names):
+        """Initialize organisation."""
+        self.names = names
+        self.listings = 0
+
+    def teams(self):
+        """List the teams."""
+        self.listings += 1
+        return [StubTeam(name) for name in self.names]
+
+    def create_team(self, name, repo_names=()):
+        """Create a team."""
+        return StubTeam(name)
+
+
+def test_teams_index(monkeypatch):
+    """Test repository teams share one listing of the organisation teams."""
+    monkeypatch.setattr(
+        github, "ExtendedTeam", lambda json, session: StubTeam(json["name"])
+    )
+    ghorg = StubOrganization(["a-maintainers", "b-maintainers"])
+    cache = ResourceCache()
+    cache.set(("org", "org"), ghorg)
+    cache.set(
+        ("org", "org", "state"),
+        OrgState(
+            {
+                name: TeamState(name, name, {"usera"}, set(), {name[0]: "maintain"})
+                for name in ghorg.names
+            }
+        ),
+    )
+    org = OrgConfig(name="org", repositories={})
+    for name in ("a", "b"):
+        conf = RepoConfig(
+            name=name, org=org, team=name + "-maintainers", maintainers=["usera"]
+        )
+        assert RepositoryAPI(None, conf=conf, cache=cache).diff_team() == []
+    assert ghorg.listings == 1
+
+    api = OrgAPI(None, conf=org, cache=cache)
+    team = api.team("a-maintainers")
+    api.delete_team(team)
+    assert team.deleted
+    assert api.team("a-maintainers") is None
+    api.create_team(TeamConfig(name="c-maintainers", repositories=["c"]))
+    assert OrgAPI(None, conf=org, cache=cache).team("c-maintainers").name == (
+        "c-maintainers"
+    )
+    assert sorted(t.name for t in api.teams()) == ["b-maintainers", "c-maintainers"]
+    assert ghorg.listings == 1
+
+
+class StubBranch(object):
+    """Branch recording protection updates."""
+
+    def __init__(self, protection):
+        """Initialize branch."""
+        self.protection = protection
+        self.updates = []
+
+    def current_protection(self):
+        """Get the REST branch protection."""
+        return self.protection
+
+    def protect(self, **protection):
+        """Protect the branch."""
+        self.updates.append(protection)
+        return protection
+
+
+class _ProtectionState(object):
+    """Prefetched repository state with only branch protection."""
+
+    def __init__(self, rule):
+        self.branch_protection = {"master": rule}
+
+
+def _protection_api(branch, state=None):
+    org = OrgConfig(name="org", repositories={})
+    conf = RepoConfig(name="repo", org=org, team="My Team", branches=["master"])
+    cache = ResourceCache()
+    cache.set(("repo", "org", "repo", "branch", "master"), branch)
+    if state is not None:
+        cache.set(("repo", "org", "repo", "state"), state)
+    return RepositoryAPI(None, conf=conf, cache=cache)
+
+
+def test_branch_protection_rest():
+    """Test branch protection read through REST is only updated on drift."""
+    current = {
+        "required_linear_history": {"enabled": True},
+        "enforce_admins": {"enabled": False},
+        "restrictions": {"users": [], "teams": [{"slug": "my-team"}]},
+    }
+    branch = StubBranch(current)
+    api = _protection_api(branch)
+    assert api.diff_branch_protection() == []
+    assert api.update_branch_protection() is False
+    assert branch.updates == []
+
+    current["enforce_admins"]["enabled"] = True
+    api = _protection_api(branch)
+    changes = api.diff_branch_protection()
+    assert [(c.op, c.params["branch"]) for c in changes] == [
+        ("protect_branch", "master")
+    ]
+    assert api.update_branch_protection() is True
+    assert len(branch.updates) == 1
+    assert branch.updates[0]["enforce_admins"] is False
+
+
+def test_branch_protection_prefetched():
+    """Test prefetched branch protection is only updated on drift."""
+    rule = {
+        "pattern": "master",
+        "requiresLinearHistory": True,
+        "isAdminEnforced": False,
+        "requiresApprovingReviews": False,
+        "requiresStatusChecks": False,
+        "restrictsPushes": True,
+        "pushAllowances": {"nodes": [{"actor": {"slug": "my-team"}}]},
+    }
+    # REST protection is not read when prefetched.
+    branch = StubBranch({})
+    state = _ProtectionState(rule)
+    api = _protection_api(branch, state)
+    assert api.update_branch_protection() is False
+    assert branch.updates == []
+
+    rule["requiresLinearHistory"] = False
+    api = _protection_api(branch, state)
+    assert [c.op for c in api.diff_branch_protection()] == ["protect_branch"]
+    assert api.update_branch_protection() is True
+    assert len(branch.updates) == 1
+    # The state follows the applied protection, so it is in sync again.
+    assert state.branch_protection["master"] == branch.updates[0]
+    assert api.diff_branch_protection() == []
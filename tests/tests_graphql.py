@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test GraphQL state fetcher against a local fake endpoint."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from metainvenio.graphql import GraphQLClient, GraphQLError, StateFetcher, graphql_url
+
+
+def _repository(name):
+    return {
+        "name": name,
+        "description": "Test repo.",
+        "homepageUrl": "https://{}.readthedocs.io".format(name),
+        "hasIssuesEnabled": True,
+        "hasWikiEnabled": False,
+        "mergeCommitAllowed": False,
+        "rebaseMergeAllowed": True,
+        "squashMergeAllowed": True,
+        "updatedAt": "2023-01-01T00:00:00Z",
+        "pushedAt": "2023-01-01T00:00:00Z",
+        "defaultBranchRef": {"name": "master"},
+        "branchProtectionRules": {"nodes": []},
+        "f0": {"oid": "abc", "text": "usera\nuserb"},
+        "f1": None,
+    }
+
+
+def _nodes(key, items, next_page=None):
+    return {
+        "pageInfo": {"hasNextPage": next_page is not None, "endCursor": next_page},
+        key: items,
+    }
+
+
+def _teams(query, variables):
+    if variables["cursor"] is None:
+        team = {
+            "name": "architects",
+            "slug": "architects",
+            "repositories": _nodes(
+                "edges", [{"permission": "ADMIN", "node": {"name": "a"}}], "r1"
+            ),
+        }
+        if "members(" in query:
+            team["members"] = _nodes("nodes", [{"login": "usera"}], "m1")
+            team["invitations"] = _nodes(
+                "nodes", [{"invitee": {"login": "userc"}}, {"invitee": None}]
+            )
+        next_page = "t1"
+    else:
+        team = {
+            "name": "developers",
+            "slug": "developers",
+            "repositories": _nodes(
+                "edges", [{"permission": "WRITE", "node": {"name": "a"}}]
+            ),
+        }
+        if "members(" in query:
+            team["members"] = _nodes("nodes", [])
+            team["invitations"] = _nodes("nodes", [])
+        next_page = None
+    return {"organization": {"teams": _nodes("nodes", [team], next_page)}}
+
+
+class FakeGraphQLHandler(BaseHTTPRequestHandler):
+    """Fake GitHub GraphQL endpoint."""
+
+    def do_POST(self):
+        """Answer a GraphQL query."""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.queries.append(body)
+        query, variables = body["query"], body["variables"]
+        errors = []
+        if "team(slug: $slug)" in query and "members(" in query:
+            team = {"members": _nodes("nodes", [{"login": "userb"}])}
+            data = {"organization": {"team": team}}
+        elif "team(slug: $slug)" in query:
+            team = {
+                "repositories": _nodes(
+                    "edges", [{"permission": "READ", "node": {"name": "b"}}]
+                )
+            }
+            data = {"organization": {"team": team}}
+        elif "teams(first: 100" in query:
+            data = _teams(query, variables)
+        else:
+            data = {}
+            for key, name in variables.items():
+                if not key.startswith("n"):
+                    continue
+                alias = "r" + key[1:]
+                if name == "missing":
+                    data[alias] = None
+                    errors.append({"type": "NOT_FOUND", "message": "Not found"})
+                else:
+                    data[alias] = _repository(name)
+        res = json.dumps({"data": data, "errors": errors}).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(res)))
+        self.end_headers()
+        self.wfile.write(res)
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+
+@pytest.fixture()
+def graphql_server():
+    """Local fake GraphQL endpoint."""
+    server = HTTPServer(("127.0.0.1", 0), FakeGraphQLHandler)
+    server.queries = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def client(graphql_server):
+    """GraphQL client for the fake endpoint."""
+    return GraphQLClient(
+        requests.Session(),
+        url="http://127.0.0.1:{}/graphql".format(graphql_server.server_port),
+    )
+
+
+def test_graphql_url():
+    """Test GraphQL endpoint for REST API base URLs."""
+    assert graphql_url("https://api.github.com") == "https://api.github.com/graphql"
+    assert (
+        graphql_url("https://github.example.org/api/v3")
+        == "https://github.example.org/api/graphql"
+    )
+
+
+def test_repositories(client, graphql_server):
+    """Test batched fetch of repository state."""
+    fetcher = StateFetcher(
+        client, files=("MAINTAINERS", ".github/pull_request_template.md"), batch_size=2
+    )
+    slugs = [("myorg", "a"), ("myorg", "missing"), ("myorg", "c")]
+    state = fetcher.repositories(slugs)
+
+    # Two queries for three repositories.
+    assert len(graphql_server.queries) == 2
+    assert state[("myorg", "missing")] is None
+    repo = state[("myorg", "a")]
+    assert repo.default_branch == "master"
+    assert repo.homepage == "https://a.readthedocs.io"
+    assert repo.files["MAINTAINERS"].decoded == b"usera\nuserb"
+    assert repo.files[".github/pull_request_template.md"] is None
+
+
+def test_team_repositories(client, graphql_server):
+    """Test paginated fetch of team repository permissions."""
+    state = StateFetcher(client).team_repositories("myorg")
+    assert state == {
+        "architects": {"a": "admin", "b": "pull"},
+        "developers": {"a": "push"},
+    }
+    assert len(graphql_server.queries) == 3
+
+
+def test_organization(client, graphql_server):
+    """Test snapshot of the teams of an organisation."""
+    state = StateFetcher(client).organization("myorg")
+    assert sorted(state.teams) == ["architects", "developers"]
+    architects = state.teams["architects"]
+    assert architects.members == {"usera", "userb"}
+    assert architects.invitations == {"userc"}
+    assert architects.repositories == {"a": "admin", "b": "pull"}
+    assert state.teams["developers"].members == set()
+    # Two pages of teams and two of architects connections.
+    assert len(graphql_server.queries) == 4
+
+
+def test_query_errors(client):
+    """Test not found errors are only ignored on request."""
+    fetcher = StateFetcher(client)
+    with pytest.raises(GraphQLError):
+        client.query(fetcher._repositories_query(1), {"o0": "myorg", "n0": "missing"})
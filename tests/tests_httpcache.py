@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test HTTP cache module."""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from metainvenio.httpcache import CachingAdapter, HTTPCache
+from metainvenio.transport import wrap_adapters
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """Serve a resource with an ETag."""
+
+    def do_GET(self):
+        """Answer conditional requests."""
+        etag = '"{}"'.format(self.server.version)
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("X-RateLimit-Remaining", "4999")
+            self.end_headers()
+            return
+        body = "version {}".format(self.server.version).encode("utf8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("X-RateLimit-Remaining", "4998")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+
+@pytest.fixture()
+def server():
+    """Local HTTP server."""
+    server = HTTPServer(("127.0.0.1", 0), ETagHandler)
+    server.version = 1
+    server.not_modified = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_requests(server, tmp_path):
+    """Test unchanged resources are served from the cache."""
+    cache = HTTPCache(str(tmp_path))
+    session = requests.Session()
+    wrap_adapters(session, lambda adapter: CachingAdapter(cache, adapter))
+    url = "http://127.0.0.1:{}/repos/myorg/testrepo".format(server.server_port)
+
+    res = session.get(url)
+    assert res.text == "version 1"
+    assert not getattr(res, "from_cache", False)
+
+    res = session.get(url)
+    assert res.status_code == 200
+    assert res.text == "version 1"
+    assert res.from_cache
+    assert res.headers["X-RateLimit-Remaining"] == "4999"
+    assert server.not_modified == 1
+
+    server.version = 2
+    res = session.get(url)
+    assert res.text == "version 2"
+    assert not getattr(res, "from_cache", False)
+
+    # Cache is persistent.
+    session = requests.Session()
+    wrap_adapters(session, lambda a: CachingAdapter(HTTPCache(str(tmp_path)), a))
+    assert session.get(url).text == "version 2"
+    assert server.not_modified == 2
+
+
+def test_eviction(tmp_path):
+    """Test least recently used entries are evicted."""
+    cache = HTTPCache(str(tmp_path), max_size=250)
+    for key in ("a", "b", "c"):
+        cache.set(key, {}, b"x" * 60)
+    for key, mtime in (("a", 1000), ("b", 2000), ("c", 3000)):
+        os.utime(str(tmp_path / (key + ".cache")), (mtime, mtime))
+
+    # Reading an entry marks it as recently used.
+    assert cache.get("a") is not None
+    assert os.stat(str(tmp_path / "a.cache")).st_mtime > 3000
+
+    cache.set("d", {}, b"x" * 60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.get("d") is not None
+
+
+def test_ttl(server, tmp_path):
+    """Test fresh responses are served without requests."""
+    cache = HTTPCache(str(tmp_path))
+    session = requests.Session()
+    wrap_adapters(session, lambda adapter: CachingAdapter(cache, adapter, ttl=60))
+    url = "http://127.0.0.1:{}/repos/myorg/testrepo".format(server.server_port)
+
+    assert session.get(url).text == "version 1"
+    server.version = 2
+    res = session.get(url)
+    assert res.text == "version 1"
+    assert res.from_cache
+    assert server.not_modified == 0
+
+    # Expired responses are revalidated.
+    key, meta, body = _entry(cache)
+    cache.set(key, dict(meta, stored=meta["stored"] - 120), body)
+    assert session.get(url).text == "version 2"
+    server.version = 3
+    assert session.get(url).text == "version 2"
+
+
+def test_offline(server, tmp_path):
+    """Test offline mode only serves stored responses."""
+    cache = HTTPCache(str(tmp_path))
+    url = "http://127.0.0.1:{}/repos/myorg/testrepo".format(server.server_port)
+    session = requests.Session()
+    wrap_adapters(session, lambda adapter: CachingAdapter(cache, adapter))
+    assert session.get(url).text == "version 1"
+
+    server.version = 2
+    session = requests.Session()
+    wrap_adapters(session, lambda a: CachingAdapter(cache, a, offline=True))
+    assert session.get(url).text == "version 1"
+    assert session.get(url + "/other").status_code == 504
+    assert server.not_modified == 0
+
+
+def _entry(cache):
+    ((_, filepath, _),) = cache._entries()
+    key = os.path.basename(filepath)[: -len(".cache")]
+    return (key,) + cache.get(key)
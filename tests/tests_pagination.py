@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test pagination module."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from github3.models import GitHubCore
+from github3.session import GitHubSession
+
+from metainvenio.pagination import paginate
+
+
+class PagesHandler(BaseHTTPRequestHandler):
+    """Serve a listing of numbers in pages."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Answer with a page and its links."""
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        per_page, page = int(query["per_page"]), int(query.get("page", 1))
+        last = (self.server.count + per_page - 1) // per_page
+        with self.server.lock:
+            self.server.pages.append(page)
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(0.05)
+        with self.server.lock:
+            self.server.active -= 1
+        items = list(range(self.server.count))[(page - 1) * per_page : page * per_page]
+        body = json.dumps(items).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if page < last:
+            url = "http://127.0.0.1:{}/items?per_page={}&page={{}}".format(
+                self.server.server_port, per_page
+            )
+            self.send_header(
+                "Link",
+                '<{}>; rel="next", <{}>; rel="last"'.format(
+                    url.format(page + 1), url.format(last)
+                ),
+            )
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+
+@pytest.fixture()
+def server():
+    """Local paginated API."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PagesHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.pages = []
+    server.active = server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("count,pages", [(0, 1), (100, 1), (450, 5)])
+def test_paginate(server, count, pages):
+    """Test all pages are fetched concurrently and items stay in order."""
+    server.count = count
+    core = GitHubCore({}, GitHubSession())
+    url = "http://127.0.0.1:{}/items".format(server.server_port)
+    items = list(paginate(core, url, lambda item, core: item, jobs=4))
+    assert items == list(range(count))
+    assert sorted(server.pages) == list(range(1, pages + 1))
+    if pages > 2:
+        assert server.max_active > 1
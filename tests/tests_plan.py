@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test plan module."""
+
+from io import StringIO
+
+import pytest
+
+from metainvenio.plan import Change, dump_plan, load_plan, sort_changes
+
+
+def test_change():
+    """Test change description and validation."""
+    change = Change("invite_member", "myorg", team="developers", params={"login": "a"})
+    assert str(change) == "myorg team developers: invite member (login=a)"
+    change = Change("write_file", "myorg", repository="testrepo", params={"path": "M"})
+    assert str(change) == "myorg/testrepo: write file (path=M)"
+    with pytest.raises(ValueError):
+        Change("unknown", "myorg")
+
+
+def test_plan_roundtrip():
+    """Test plans are sorted and serialized."""
+    changes = [
+        Change("edit_repository", "myorg", repository="testrepo"),
+        Change("invite_member", "myorg", team="developers", params={"login": "a"}),
+        Change("create_team", "myorg", team="developers"),
+    ]
+    assert [c.op for c in sort_changes(changes)] == [
+        "create_team",
+        "invite_member",
+        "edit_repository",
+    ]
+    fp = StringIO()
+    dump_plan(changes, fp)
+    fp.seek(0)
+    assert load_plan(fp) == changes
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test worker pool module."""
+
+import threading
+
+from metainvenio.pool import run_tasks
+
+
+def _task(n):
+    if n == 3:
+        raise ValueError("boom")
+    return n * 2
+
+
+def test_run_tasks_sequential():
+    """Test results and errors are collected in order."""
+    results = list(run_tasks(_task, [1, 2, 3, 4]))
+    assert [r.item for r in results] == [1, 2, 3, 4]
+    assert [r.value for r in results] == [2, 4, None, 8]
+    assert isinstance(results[2].error, ValueError)
+
+
+def test_run_tasks_concurrent():
+    """Test concurrent results keep the input order."""
+    barrier = threading.Barrier(4)
+
+    def task(n):
+        # All four tasks must run at the same time to pass the barrier.
+        barrier.wait(timeout=5)
+        return _task(n)
+
+    results = list(run_tasks(task, [1, 2, 3, 4], jobs=4))
+    assert [r.value for r in results] == [2, 4, None, 8]
+    assert isinstance(results[2].error, ValueError)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test PyPI client against a local stub index."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from click.testing import CliRunner
+
+from metainvenio.cli import cli
+from metainvenio.pypi import PyPIAPI
+
+
+def _release(name):
+    return {
+        "info": {
+            "name": name,
+            "version": "1.0.0",
+            "classifiers": ["Development Status :: 5 - Production/Stable"],
+        },
+        "releases": {"1.0.0": [{"upload_time": "2023-01-02T10:00:00"}]},
+    }
+
+
+class StubIndexHandler(BaseHTTPRequestHandler):
+    """Stub of the PyPI JSON API."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Answer with the release of a package."""
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.paths.append(self.path)
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            name = self.path.split("/")[2]
+            if name.startswith("missing"):
+                status, body = 404, b"{}"
+            else:
+                status, body = 200, json.dumps(_release(name)).encode("utf8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+
+@pytest.fixture()
+def index_server():
+    """Local stub package index."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubIndexHandler)
+    server.daemon_threads = True
+    server.latency = 0.05
+    server.lock = threading.Lock()
+    server.active = server.max_active = 0
+    server.paths = []
+    server.url = "http://127.0.0.1:{}".format(server.server_port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_latest_releases(index_server):
+    """Test fetching packages concurrently in order."""
+    api = PyPIAPI(url=index_server.url, pool_size=4)
+    names = ["pkg{}".format(i) for i in range(8)] + ["missing"]
+    results = list(api.latest_releases(names, jobs=4))
+    assert [r.item for r in results] == names
+    assert [r.value["info"]["name"] for r in results[:-1]] == names[:-1]
+    assert results[-1].value is None
+    assert 1 < index_server.max_active <= 4
+
+
+def _latest_release(index_server, tmp_path, *args):
+    conf = tmp_path / "repositories.yml"
+    conf.write_text(
+        "orgs:\n  myorg:\n    repositories:\n"
+        "      pkg-a: {}\n      missing-b: {}\n      pkg-c: {}\n"
+    )
+    return CliRunner().invoke(
+        cli,
+        [
+            "-c",
+            str(conf),
+            "--no-config-cache",
+            "--cache-dir",
+            str(tmp_path / "cache"),
+            "pypi",
+            "--index-url",
+            index_server.url,
+            "-j",
+            "3",
+        ]
+        + list(args)
+        + ["latest-release"],
+    )
+
+
+def test_latest_release_cli(index_server, tmp_path):
+    """Test the latest-release command."""
+    result = _latest_release(index_server, tmp_path, "--no-cache")
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "myorg/pkg-a: 1.0.0 (5 - Production/Stable - 2023-01-02)",
+        "myorg/missing-b: failed",
+        "myorg/pkg-c: 1.0.0 (5 - Production/Stable - 2023-01-02)",
+    ]
+
+
+def test_latest_release_cli_cache(index_server, tmp_path):
+    """Test responses are cached between runs."""
+    output = _latest_release(index_server, tmp_path).output
+    assert len(index_server.paths) == 3
+
+    del index_server.paths[:]
+    assert _latest_release(index_server, tmp_path).output == output
+    # Only the missing package is fetched again.
+    assert index_server.paths == ["/pypi/missing-b/json"]
+
+    del index_server.paths[:]
+    result = _latest_release(index_server, tmp_path, "--offline")
+    assert result.output == output
+    assert index_server.paths == []
+
+    result = _latest_release(index_server, tmp_path, "--offline", "--no-cache")
+    assert result.exit_code == 2
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test rate limit module."""
+
+import json
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from metainvenio.ratelimit import (
+    RateLimitAdapter,
+    RateLimiter,
+    is_write,
+    parse_retry_after,
+    request_resource,
+)
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Adapter answering with a list of scripted responses."""
+
+    def __init__(self, script):
+        """Initialize adapter."""
+        super(ScriptedAdapter, self).__init__()
+        self.script = list(script)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        """Send the next scripted response."""
+        self.requests.append(request)
+        status, headers = self.script.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = b""
+        response._content_consumed = True
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        """Close adapter."""
+
+
+def _session(limiter, script):
+    adapter = ScriptedAdapter(script)
+    session = requests.Session()
+    session.mount("https://", RateLimitAdapter(limiter, adapter))
+    return session, adapter
+
+
+def test_secondary_rate_limit():
+    """Test secondary rate limits are retried with lower concurrency."""
+    limiter = RateLimiter(max_concurrency=8)
+    session, adapter = _session(
+        limiter, [(403, {"Retry-After": "0"}), (200, {"X-RateLimit-Remaining": "50"})]
+    )
+    res = session.get("https://api.github.com/repos/myorg/testrepo")
+    assert res.status_code == 200
+    assert len(adapter.requests) == 2
+    assert limiter.concurrency < 8
+    assert limiter.limits["core"]["remaining"] == 50
+
+
+def test_primary_rate_limit():
+    """Test requests are paused until the rate limit resets."""
+    limiter = RateLimiter(reserve=10)
+    reset = str(int(time.time()))
+    session, adapter = _session(
+        limiter,
+        [
+            (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}),
+            (200, {"X-RateLimit-Remaining": "5000", "X-RateLimit-Reset": reset}),
+        ],
+    )
+    res = session.get("https://api.github.com/repos/myorg/testrepo")
+    assert res.status_code == 200
+    assert len(adapter.requests) == 2
+    # Rate limit exhaustion does not reduce concurrency.
+    assert limiter.concurrency == limiter.max_concurrency
+
+
+def test_retry_idempotent_only():
+    """Test only idempotent requests are retried on server errors."""
+    limiter = RateLimiter()
+    limiter.backoff = lambda attempt: 0
+    session, adapter = _session(
+        limiter, [(502, {}), (requests.ConnectionError(), {}), (200, {})]
+    )
+    assert session.get("https://api.github.com/").status_code == 200
+    assert len(adapter.requests) == 3
+
+    limiter.write_interval = 0
+    session, adapter = _session(limiter, [(502, {}), (200, {})])
+    assert session.post("https://api.github.com/").status_code == 502
+    session, adapter = _session(limiter, [(requests.ConnectionError(), {})])
+    with pytest.raises(requests.ConnectionError):
+        session.patch("https://api.github.com/")
+
+
+def test_adaptive_concurrency():
+    """Test concurrency is halved on limits and grows back on success."""
+    limiter = RateLimiter(max_concurrency=4)
+    limiter.acquire()
+    limiter.release(_response(429, {"Retry-After": "0"}))
+    assert limiter.concurrency == 2
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(_response(200, {}))
+    assert limiter.concurrency == 4
+
+
+def test_resource_rate_limits():
+    """Test an exhausted resource does not pause requests to other ones."""
+    limiter = RateLimiter(reserve=10)
+    reset = str(int(time.time()) + 3000)
+    limiter.acquire("POST", "graphql")
+    limiter.release(
+        _response(
+            200,
+            {
+                "X-RateLimit-Resource": "graphql",
+                "X-RateLimit-Remaining": "5",
+                "X-RateLimit-Reset": reset,
+            },
+        ),
+        "graphql",
+    )
+    limiter.acquire("GET", "core")
+    limiter.release(
+        _response(
+            200,
+            {
+                "X-RateLimit-Resource": "core",
+                "X-RateLimit-Remaining": "4000",
+                "X-RateLimit-Reset": reset,
+            },
+        )
+    )
+    assert limiter.limits["graphql"]["remaining"] == 5
+    assert limiter.limits["core"]["remaining"] == 4000
+
+    start = time.time()
+    limiter.acquire("GET", "core")
+    limiter.release()
+    assert time.time() - start < 1
+    assert limiter._resource_paused_until["graphql"] > start + 2000
+    assert limiter._paused_until == 0
+
+    assert request_resource("https://api.github.com/graphql") == "graphql"
+    assert request_resource("https://api.github.com/search/code?q=a") == "search"
+    assert request_resource("https://api.github.com/repos/myorg/a") == "core"
+
+
+def test_retry_after_date():
+    """Test ``Retry-After`` dates and invalid values are handled."""
+    date = formatdate(time.time() + 30, usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after("soon") is None
+
+    limiter = RateLimiter()
+    limiter.acquire()
+    delay = limiter.release(_response(429, {"Retry-After": "soon"}))
+    assert delay == 60.0
+    assert limiter._active == 0
+
+
+def test_graphql_queries_not_spaced():
+    """Test only GraphQL mutations are spaced like writes."""
+    query = json.dumps({"query": "query($org: String!) { viewer { login } }"})
+    mutation = json.dumps({"query": "mutation { addStar { clientMutationId } }"})
+    assert not is_write("POST", "graphql", query)
+    assert not is_write("POST", "graphql", query.encode("utf8"))
+    assert is_write("POST", "graphql", mutation)
+    assert is_write("POST", "core")
+    assert not is_write("GET", "core")
+
+    limiter = RateLimiter(write_interval=1.0)
+    session, adapter = _session(limiter, [(200, {})] * 3)
+    start = time.time()
+    for _ in range(3):
+        session.post("https://api.github.com/graphql", data=query)
+    assert time.time() - start < 0.5
+    assert len(adapter.requests) == 3
+
+
+def _response(status, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response._content = b""
+    response._content_consumed = True
+    return response
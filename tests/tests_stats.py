@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test stats module."""
+
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from metainvenio.ratelimit import RateLimitAdapter, RateLimiter
+from metainvenio.stats import Histogram, RequestStats, StatsAdapter, endpoint_template
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Adapter answering with a list of scripted responses."""
+
+    def __init__(self, script):
+        """Initialize adapter."""
+        super(ScriptedAdapter, self).__init__()
+        self.script = list(script)
+
+    def send(self, request, **kwargs):
+        """Send the next scripted response."""
+        status, headers, body = self.script.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = body
+        response._content_consumed = True
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        """Close adapter."""
+
+
+@pytest.mark.parametrize(
+    "url,template",
+    [
+        ("https://api.github.com/orgs/myorg", "/orgs/{org}"),
+        ("https://api.github.com/orgs/myorg/teams?per_page=100", "/orgs/{org}/teams"),
+        (
+            "https://api.github.com/teams/12/memberships/usera",
+            "/teams/{id}/memberships/{user}",
+        ),
+        ("https://api.github.com/repos/myorg/repo", "/repos/{owner}/{repo}"),
+        (
+            "https://api.github.com/repos/myorg/repo/contents/.github/template.md",
+            "/repos/{owner}/{repo}/contents/{+path}",
+        ),
+        (
+            "https://api.github.com/repos/myorg/repo/git/trees/abc",
+            "/repos/{owner}/{repo}/git/trees/{sha}",
+        ),
+        ("https://github.example.org/api/v3/repos/myorg/repo", "/repos/{owner}/{repo}"),
+        ("https://github.example.org/api/graphql", "/graphql"),
+        ("https://pypi.org/pypi/invenio-app/json", "/pypi/{package}/json"),
+        ("https://example.org/unknown/path", "/unknown/path"),
+    ],
+)
+def test_endpoint_template(url, template):
+    """Test endpoint templates."""
+    assert endpoint_template(url) == template
+
+
+def test_histogram():
+    """Test latency percentiles."""
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    for i in range(1, 101):
+        histogram.add(i / 1000.0)
+    assert 0.04 <= histogram.percentile(50) <= 0.0625
+    assert 0.08 <= histogram.percentile(90) <= 0.125
+    assert histogram.percentile(100) == 0.1
+
+
+def test_stats_adapter():
+    """Test statistics of retries, conditional requests and rate limits."""
+    stats = RequestStats()
+    adapter = ScriptedAdapter(
+        [
+            (503, {}, b"error"),
+            (200, {"X-RateLimit-Remaining": "99"}, b"data"),
+            (304, {"X-RateLimit-Remaining": "99"}, b""),
+        ]
+    )
+    session = requests.Session()
+    session.mount(
+        "https://",
+        RateLimitAdapter(
+            RateLimiter(max_backoff=0), StatsAdapter(stats, adapter), max_retries=1
+        ),
+    )
+    assert session.get("https://api.github.com/repos/org/a").status_code == 200
+    assert session.get("https://api.github.com/repos/org/b").status_code == 304
+
+    data = stats.to_dict()
+    repo = data["endpoints"]["GET /repos/{owner}/{repo}"]
+    assert repo["calls"] == 3
+    assert repo["errors"] == 1
+    assert repo["retries"] == 1
+    assert repo["not_modified"] == 1
+    assert repo["bytes_received"] == 9
+    assert data["rate_limits"] == {"core": {"remaining": 99, "used": 1}}
+    json.dumps(data)
+    assert "GET /repos/{owner}/{repo}" in stats.format_table()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test sync state module."""
+
+import os
+
+from metainvenio.cli.github import _config_fingerprint
+from metainvenio.config import OrgConfig, RepoConfig
+from metainvenio.syncstate import SyncState, config_fingerprint
+
+
+def test_config_fingerprint():
+    """Test fingerprint of the repository configuration."""
+    org = OrgConfig(name="org", repositories={})
+    repo = RepoConfig(name="repo", org=org, maintainers=["a"])
+    fp = config_fingerprint(repo, with_maintainers_file=True)
+    assert fp == config_fingerprint(repo, with_maintainers_file=True)
+    assert fp != config_fingerprint(repo, with_maintainers_file=False)
+    # Other repositories of the organisation do not matter.
+    other = OrgConfig(name="org", repositories={"other": {}})
+    repo = RepoConfig(name="repo", org=other, maintainers=["a"])
+    assert fp == config_fingerprint(repo, with_maintainers_file=True)
+    repo = RepoConfig(name="repo", org=org, maintainers=["a", "b"])
+    assert fp != config_fingerprint(repo, with_maintainers_file=True)
+
+
+def test_syncstate(tmp_path):
+    """Test recording and loading the sync state."""
+    path = str(tmp_path / "state" / "sync.json")
+    state = SyncState(path)
+    assert not state.unchanged("org/repo", "c", "r")
+    state.record("org/repo", "c", "r")
+    state.record("org/other", "c", None)
+    state.save()
+
+    state = SyncState(path)
+    assert state.unchanged("org/repo", "c", "r")
+    assert not state.unchanged("org/repo", "c2", "r")
+    assert not state.unchanged("org/repo", "c", "r2")
+    assert not state.unchanged("org/repo", "c", None)
+    assert not state.unchanged("org/other", "c", None)
+    state.forget("org/repo")
+    assert not state.unchanged("org/repo", "c", "r")
+
+
+def test_syncstate_corrupt(tmp_path):
+    """Test a corrupt state file is ignored."""
+    path = tmp_path / "sync.json"
+    path.write_text("{not json")
+    assert SyncState(str(path)).repositories == {}
+
+
+def test_pull_template_fingerprint(tmp_path, monkeypatch):
+    """Test changes to the local pull request template are detected."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(".github")
+    template = tmp_path / ".github" / "pull_request_template.md"
+    template.write_text("template\n")
+    repo = RepoConfig(name="repo", org=OrgConfig(name="org", repositories={}))
+    state = SyncState(str(tmp_path / "sync.json"))
+    state.record("org/repo", _config_fingerprint(repo, False, True), "r")
+    assert state.unchanged("org/repo", _config_fingerprint(repo, False, True), "r")
+
+    template.write_text("new template\n")
+    assert not state.unchanged("org/repo", _config_fingerprint(repo, False, True), "r")
+    # The template does not matter when it is not synchronised.
+    assert _config_fingerprint(repo, False, False) == config_fingerprint(
+        repo, with_maintainers_file=False, with_pull_template=False
+    )
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2023 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test tracing module."""
+
+import cProfile
+import json
+import pstats
+import threading
+from io import StringIO
+
+import pytest
+
+from metainvenio.pool import run_tasks
+from metainvenio.tracing import Profiler, Tracer, set_tracer, span, traced
+
+
+@pytest.fixture()
+def tracer():
+    """Installed tracer."""
+    tracer = Tracer()
+    set_tracer(tracer)
+    yield tracer
+    set_tracer(None)
+
+
+@traced("double")
+def double(x):
+    """Double a value."""
+    with span("inner", "test", value=x) as args:
+        args["result"] = 2 * x
+        return 2 * x
+
+
+def test_spans(tracer):
+    """Test recording spans."""
+    assert list(run_tasks(double, [1, 2], jobs=2))[1].value == 4
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("boom")
+
+    fp = StringIO()
+    tracer.dump(fp)
+    events = json.loads(fp.getvalue())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    assert sorted(e["name"] for e in spans) == sorted(
+        ["queued", "queued", "double", "double", "inner", "inner", "failing"]
+    )
+    inner = [e for e in spans if e["name"] == "inner"]
+    assert sorted(e["args"]["result"] for e in inner) == [2, 4]
+    outer = [e for e in spans if e["name"] == "double"]
+    for e in inner:
+        assert any(
+            o["tid"] == e["tid"]
+            and o["ts"] <= e["ts"]
+            and e["ts"] + e["dur"] <= o["ts"] + o["dur"]
+            for o in outer
+        )
+    assert [e["args"] for e in spans if e["name"] == "failing"] == [{"error": "boom"}]
+    assert any(e["ph"] == "M" for e in events)
+
+
+def test_disabled():
+    """Test spans without tracer."""
+    assert double(2) == 4
+
+
+def test_profiler(tmp_path):
+    """Test profiling of the main and new threads."""
+
+    def work():
+        sum(range(1000))
+
+    profiler = Profiler()
+    profiler.start()
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    profiler.stop()
+    path = str(tmp_path / "profile")
+    profiler.dump(path)
+    assert len(profiler.profiles) == 2
+    functions = {f[2] for f in pstats.Stats(path).stats}
+    assert "work" in functions
+
+
+def test_profiler_active(tmp_path, monkeypatch):
+    """Test threads are not broken when another profiler is active."""
+
+    class ActiveProfile(cProfile.Profile):
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(cProfile, "Profile", ActiveProfile)
+    profiler = Profiler()
+    profiler.start()
+    profiler._start_thread()
+    profiler.stop()
+    path = tmp_path / "profile"
+    profiler.dump(str(path))
+    assert profiler.profiles == []
+    assert path.exists()